@@ -0,0 +1,115 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def history_key(messages):
+    """Fingerprint of a conversation history; empty history maps to ""."""
+    if not messages:
+        return ""
+    text = "\n".join(f"{getattr(m, 'type', '')}:{getattr(m, 'content', m)}" for m in messages)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SemanticAnswerCache:
+    """Caches (answer, context) pairs keyed by question embedding.
+
+    A lookup hits when a stored question's cosine similarity to the new one is
+    at least `threshold`, the conversation history fingerprint is the same, the
+    entry is younger than `ttl` seconds and the corpus version hasn't changed
+    since it was stored. Vectors sit in a preallocated matrix so a lookup is a
+    single matrix-vector product; the least recently used entry is evicted
+    when the cache is full.
+    """
+
+    def __init__(self, threshold=0.95, ttl=24 * 3600, max_entries=1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.corpus_version = None
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+        self._entries = OrderedDict()  # slot -> entry, least recently used first
+        self._free = list(range(max_entries))
+        self._lock = threading.Lock()
+
+    def _normalize(self, embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def set_corpus_version(self, version):
+        """Drops every entry if the ingested corpus changed since the last call."""
+        with self._lock:
+            if version != self.corpus_version:
+                self._clear()
+                self.corpus_version = version
+
+    def _clear(self):
+        self._entries.clear()
+        self._free = list(range(self.max_entries))
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _evict(self, slot):
+        del self._entries[slot]
+        self._free.append(slot)
+
+    def lookup(self, embedding, history=""):
+        """Returns (answer, context) for a similar enough cached question, else None."""
+        if self.max_entries <= 0:
+            return None
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            if self._entries:
+                slots = np.fromiter(self._entries.keys(), dtype=np.int64, count=len(self._entries))
+                scores = (self._vectors @ query)[slots]
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    slot = int(slots[i])
+                    entry = self._entries[slot]
+                    if now - entry["created"] > self.ttl:
+                        self._evict(slot)
+                        continue
+                    if entry["history"] == history:
+                        self._entries.move_to_end(slot)
+                        self.hits += 1
+                        return entry["answer"], entry["context"]
+            self.misses += 1
+            return None
+
+    def put(self, embedding, answer, context, history=""):
+        if self.max_entries <= 0:
+            return
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+                self._clear()
+            if not self._free:
+                self._evict(next(iter(self._entries)))
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._entries[slot] = {
+                "answer": answer,
+                "context": context,
+                "history": history,
+                "created": time.time(),
+            }
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
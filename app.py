@@ -1,6 +1,9 @@
 import streamlit as st
 from rag_bot import RAGBot
+from tracing import METRICS
 import os
+import time
+import uuid
 
 # Page Config
 st.set_page_config(page_title="Class 6 English RAG Bot", page_icon="📚", layout="wide")
@@ -16,17 +19,39 @@ It uses **ChromaDB** for text search and **Neo4j** for knowledge graph relations
 @st.cache_resource
 def get_bot():
     try:
-        return RAGBot()
+        bot = RAGBot()
+        # Open every backend connection now, in parallel, rather than on the first question
+        for name, check in bot.warmup()["checks"].items():
+            if not check["ok"]:
+                print(f"Warm-up: {name} unavailable ({check['detail']})")
+        return bot
     except Exception as e:
         st.error(f"Failed to initialize bot: {e}")
         return None
 
 bot = get_bot()
 
+def track_stream(stream, stats):
+    """Passes tokens through from a RAGBot stream, recording timings and the returned context."""
+    start = time.perf_counter()
+    while True:
+        try:
+            token = next(stream)
+        except StopIteration as stop:
+            stats["context"] = stop.value
+            stats["total"] = time.perf_counter() - start
+            return
+        stats.setdefault("ttft", time.perf_counter() - start)
+        yield token
+
 # Initialize Chat History
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+# The bot is shared by every browser session; its memory is keyed by this ID
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 # Display Chat History
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
@@ -44,15 +69,23 @@ if prompt := st.chat_input("Ask a question about the stories..."):
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
                 try:
-                    response, context = bot.generate_response(prompt)
-                    st.markdown(response)
+                    # Render tokens as they arrive instead of waiting for the full answer
+                    stats = {}
+                    response = st.write_stream(track_stream(bot.generate_response_stream(prompt, st.session_state.session_id), stats))
                     
                     # Add assistant message to history
                     st.session_state.messages.append({"role": "assistant", "content": response})
                     
                     # Show Context in Expander
                     with st.expander("View Retrieval Context (Debug)"):
-                        st.text(context)
+                        st.caption(
+                            f"Time to first token: {stats.get('ttft', 0):.2f}s · "
+                            f"Total: {stats.get('total', 0):.2f}s"
+                        )
+                        trace = bot.last_trace(st.session_state.session_id)
+                        if trace:
+                            st.text(trace.format())
+                        st.text(stats.get("context", ""))
                         
                 except Exception as e:
                     st.error(f"Error generating response: {e}")
@@ -67,6 +100,28 @@ with st.sidebar:
     st.subheader("Tech Stack")
     st.code("LangChain\nChromaDB\nNeo4j\nOpenAI GPT-4o")
     
+    if bot and st.button("Check backends"):
+        status = bot.health()
+        for name, check in status["checks"].items():
+            latency = f" · {check['latency_ms']:.0f} ms" if check["latency_ms"] is not None else ""
+            st.caption(f"{'✅' if check['ok'] else '❌'} {name}: {check['detail']}{latency}")
+
+    st.subheader("Performance")
+    metrics = METRICS.snapshot()
+    if metrics["spans"]:
+        st.dataframe(
+            [{"stage": name, "count": m["count"], "p50 ms": round(m["p50_ms"], 1), "p95 ms": round(m["p95_ms"], 1)}
+             for name, m in metrics["spans"].items()],
+            hide_index=True
+        )
+        st.caption(" · ".join(f"{name}: {value}" for name, value in metrics["counters"].items()))
+        st.download_button("Export metrics (JSON)", METRICS.to_json(), file_name="ragbot_metrics.json")
+        st.download_button("Export metrics (Prometheus)", METRICS.to_prometheus(), file_name="ragbot_metrics.prom")
+    else:
+        st.caption("No requests traced yet.")
+    
     if st.button("Clear Chat History"):
         st.session_state.messages = []
+        if bot:
+            bot.memory.clear(st.session_state.session_id)
         st.rerun()
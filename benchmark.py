@@ -0,0 +1,261 @@
+"""Offline latency/throughput benchmark for the ingest and query pipelines.
+
+Runs ingest_documents and RAGBot.generate_response against local stand-ins
+(fakes.FakeEmbeddings / FakeChatModel with configurable latency, the local
+vector store and fakes.FakeNeo4jDriver), so no API keys or network are needed.
+Results go to JSON so runs can be compared over time:
+
+    python benchmark.py --pages 40 --concurrency 1 4 16 --output bench_output.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+
+from answer_cache import SemanticAnswerCache
+from fakes import FakeChatModel, FakeEmbeddings, FakeNeo4jDriver
+from ingest_data import ingest_documents
+from rag_bot import RAGBot
+from vector_store import LocalVectorStore
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_QUESTIONS = [
+    "Who are the main characters in the stories?",
+    "What is the moral of the story about the turtle?",
+    "What did Ravi find near the river?",
+    "Why was Meena worried about Kumar?",
+    "Tell me about a specific vocabulary word defined in the text.",
+    "What is the capital of France?",
+]
+
+NAMES = ["Ravi", "Meena", "Kumar", "Tenali", "Raman", "Kaveri", "Turtle", "Hare", "Kalam", "Lakshmi"]
+WORDS = ("the boy walked to the river and saw a small bird singing near the old tree while "
+         "his friend laughed because the turtle was slow but patient and finally won the race").split()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def latency_summary(seconds):
+    return {
+        "count": len(seconds),
+        "mean_ms": 1000 * sum(seconds) / len(seconds) if seconds else 0.0,
+        "p50_ms": 1000 * percentile(seconds, 50),
+        "p95_ms": 1000 * percentile(seconds, 95),
+        "p99_ms": 1000 * percentile(seconds, 99),
+    }
+
+
+class StageTimer:
+    """Collects wall-clock samples per named stage; wrap() times any callable."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_async(self, stage, func):
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def summary(self, prefix):
+        return {stage[len(prefix):]: latency_summary(values)
+                for stage, values in sorted(self.samples.items()) if stage.startswith(prefix)}
+
+
+def synthetic_pages(count, seed=0):
+    """Deterministic textbook-like pages mentioning a recurring cast of characters."""
+    rng = random.Random(seed)
+    pages = []
+    for page in range(count):
+        sentences = []
+        for _ in range(40):
+            words = rng.sample(WORDS, 10)
+            words.insert(rng.randrange(10), rng.choice(NAMES))
+            sentences.append(" ".join(words).capitalize() + ".")
+        pages.append(Document(page_content=" ".join(sentences),
+                              metadata={"source": "synthetic.pdf", "page": page}))
+    return pages
+
+
+def run_ingest(args, timer, workdir):
+    embeddings = FakeEmbeddings(latency=args.embed_latency)
+    embeddings.embed_documents = timer.wrap("ingest.embed", embeddings.embed_documents)
+    collection = LocalVectorStore(os.path.join(workdir, "vector_store"))
+    collection.upsert = timer.wrap("ingest.store_write", collection.upsert)
+    driver = FakeNeo4jDriver(latency=args.graph_latency)
+    driver.run = timer.wrap("ingest.graph_write", driver.run)
+
+    docs = synthetic_pages(args.pages)
+    start = time.perf_counter()
+    ingest_documents(docs, "synthetic.pdf", embeddings_model=embeddings, collection=collection,
+                     llm=FakeChatModel(latency=args.llm_latency), driver=driver,
+                     manifest_path=os.path.join(workdir, "manifest.json"))
+    timer.record("ingest.total", time.perf_counter() - start)
+    return collection, driver
+
+
+def build_bot(args, timer, collection, driver):
+    embeddings = FakeEmbeddings(latency=args.embed_latency)
+    embeddings.embed_query = timer.wrap("query.embed", embeddings.embed_query)
+    del driver.run  # drop the ingest-stage wrapper
+    driver.run = timer.wrap("query.graph_db", driver.run)
+    bot = RAGBot(collection=collection, neo4j_driver=driver, embeddings=embeddings,
+                 llm=FakeChatModel(latency=args.llm_latency))
+    if not args.answer_cache:
+        bot.answer_cache = SemanticAnswerCache(max_entries=0)
+    if args.neo4j_graph:
+        bot.graph_snapshot = None
+    bot.vector_search = timer.wrap("query.vector_search", bot.vector_search)
+    bot.graph_search = timer.wrap("query.graph_search", bot.graph_search)
+    bot._aprepare = timer.wrap_async("query.retrieval", bot._aprepare)
+    return bot
+
+
+def ask_all(bot, questions, concurrency, timer=None):
+    """Answers every question with `concurrency` parallel askers; returns (latencies, wall seconds)."""
+    latencies = []
+    lock = threading.Lock()
+
+    def ask(i):
+        start = time.perf_counter()
+        bot.generate_response(questions[i], session_id=f"asker-{i % concurrency}")
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+        if timer:
+            timer.record("query.total", elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(ask, range(len(questions))))
+    return latencies, time.perf_counter() - start
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_benchmark(args):
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        questions = DEFAULT_QUESTIONS
+
+    if args.trace_memory:
+        tracemalloc.start()
+    timer = StageTimer()
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        # Relative data/ paths (embedding cache, corpus version) land in the scratch dir
+        os.chdir(workdir)
+        try:
+            collection, driver = run_ingest(args, timer, workdir)
+            ingest_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+
+            bot = build_bot(args, timer, collection, driver)
+            ask_all(bot, questions * args.rounds, 1, timer)
+
+            throughput = []
+            for concurrency in args.concurrency:
+                batch = questions * max(args.rounds, concurrency)
+                latencies, wall = ask_all(bot, batch, concurrency)
+                throughput.append(dict(concurrency=concurrency, questions=len(batch), seconds=wall,
+                                       qps=len(batch) / wall, **latency_summary(latencies)))
+            query_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+        finally:
+            os.chdir(previous_dir)
+            if args.trace_memory:
+                tracemalloc.stop()
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "corpus": {"pages": args.pages, "chunks": collection.count(), "graph_edges": len(driver.edges)},
+        "ingest": timer.summary("ingest."),
+        "query": timer.summary("query."),
+        "throughput": throughput,
+        "memory": {
+            "peak_rss_mb": peak_rss_mb(),
+            "ingest_traced_peak_mb": ingest_peak / 2 ** 20 if ingest_peak is not None else None,
+            "query_traced_peak_mb": query_peak / 2 ** 20 if query_peak is not None else None,
+        },
+    }
+
+
+def print_report(results):
+    print(f"\nCorpus: {results['corpus']}")
+    for section in ("ingest", "query"):
+        print(f"\n{section.upper():<20}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage, stats in results[section].items():
+            print(f"{stage:<20}{stats['count']:>7}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+    print(f"\n{'CONCURRENCY':<20}{'qps':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for row in results["throughput"]:
+        print(f"{row['concurrency']:<20}{row['qps']:>7.1f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+    print(f"\nMemory: {results['memory']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark for ingest_data and RAGBot.")
+    parser.add_argument("--questions", help="file with one question per line (default: built-in set)")
+    parser.add_argument("--pages", type=int, default=20, help="synthetic textbook pages to ingest")
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the question set")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="seconds per embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per chat model call")
+    parser.add_argument("--graph-latency", type=float, default=0.02, help="seconds per Neo4j query")
+    parser.add_argument("--answer-cache", action="store_true", help="leave the semantic answer cache on")
+    parser.add_argument("--neo4j-graph", action="store_true",
+                        help="query the (fake) Neo4j driver instead of the in-memory graph snapshot")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also report Python heap peaks via tracemalloc (slows the run)")
+    parser.add_argument("--output", default="bench_output.json")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = run_benchmark(args)
+    print_report(results)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
@@ -0,0 +1,19 @@
+import pytest
+
+from fakes import FakeChatModel, FakeEmbeddings, FakeNeo4jDriver
+from rag_bot import RAGBot
+from vector_store import LocalVectorStore
+
+
+@pytest.fixture
+def make_bot(tmp_path, monkeypatch):
+    """Runs the test in tmp_path and builds RAGBots on fakes; keyword arguments replace any of them."""
+    monkeypatch.chdir(tmp_path)
+
+    def make(**kwargs):
+        kwargs.setdefault("collection", LocalVectorStore(str(tmp_path / "store")))
+        kwargs.setdefault("neo4j_driver", FakeNeo4jDriver())
+        kwargs.setdefault("embeddings", FakeEmbeddings())
+        kwargs.setdefault("llm", FakeChatModel())
+        return RAGBot(**kwargs)
+    return make
@@ -0,0 +1,178 @@
+"""Assembles the answer prompt's context within a token budget.
+
+Vector search returns more candidates than fit in the prompt. They are
+narrowed with maximal marginal relevance (MMR) over their stored embeddings,
+so near-duplicates don't crowd out other relevant passages; chunks that are
+neighbouring splitter windows (which share their 200-character overlap) are
+merged into one passage; graph triples are ranked against the question and
+the chosen passages; and the result is cut to fit the budget.
+"""
+import numpy as np
+
+from entity_index import STOPWORDS, normalize_tokens
+from graph_extraction import estimate_tokens
+
+# Shortest shared run of text treated as splitter overlap rather than coincidence
+MIN_OVERLAP_CHARS = 40
+
+
+def mmr(relevance, embeddings, k, lambda_mult=0.7):
+    """Indices of up to k candidates picked by maximal marginal relevance.
+
+    relevance[i] is candidate i's similarity to the question; embeddings are
+    its vectors. Each step takes the candidate maximizing
+    lambda * relevance - (1 - lambda) * (max similarity to those already picked).
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    closest = similarity[selected[0]].copy()
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * closest
+        scores[selected] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        closest = np.maximum(closest, similarity[pick])
+    return selected
+
+
+def overlap_length(first, second, min_overlap=MIN_OVERLAP_CHARS):
+    """Length of the longest suffix of `first` that starts `second`, or 0 if under min_overlap."""
+    probe = second[:min_overlap]
+    if len(probe) < min_overlap:
+        return 0
+    start = first.find(probe)
+    while start != -1:
+        if second.startswith(first[start:]):
+            return len(first) - start
+        start = first.find(probe, start + 1)
+    return 0
+
+
+def _merge_pass(passages):
+    merged = []
+    for text in passages:
+        for i, kept in enumerate(merged):
+            if text in kept:
+                break
+            if kept in text:
+                merged[i] = text
+                break
+            tail = overlap_length(kept, text)
+            if tail:
+                merged[i] = kept + text[tail:]
+                break
+            head = overlap_length(text, kept)
+            if head:
+                merged[i] = text + kept[head:]
+                break
+        else:
+            merged.append(text)
+    return merged
+
+
+def merge_overlapping(passages):
+    """Joins passages that continue one another and drops ones contained in another.
+
+    Keeps the rank order: a merged passage takes the place of its best-ranked part.
+    """
+    passages = [p.strip() for p in passages if p.strip()]
+    merged = _merge_pass(passages)
+    # A merge can make two kept passages continue each other; repeat until stable
+    while len(merged) < len(passages):
+        passages, merged = merged, _merge_pass(merged)
+    return merged
+
+
+def rank_triples(triples, query, passages=()):
+    """Orders triples by the question words they mention, then by names found in the passages.
+
+    Ties keep the graph search's own order (its full-text ranking).
+    """
+    terms = {t for t in normalize_tokens(query) if t not in STOPWORDS}
+    context_words = set()
+    for text in passages:
+        context_words.update(normalize_tokens(text))
+
+    def score(item):
+        position, triple = item
+        words = set(normalize_tokens(triple))
+        return (-len(words & terms), -len(words & context_words), position)
+
+    return [triple for _, triple in sorted(enumerate(triples), key=score)]
+
+
+def fit_to_budget(items, budget):
+    """Takes items in order while they fit in `budget` tokens; returns (items, tokens used)."""
+    chosen, used = [], 0
+    for item in items:
+        cost = estimate_tokens(item)
+        if used + cost > budget:
+            continue
+        chosen.append(item)
+        used += cost
+    return chosen, used
+
+
+def candidates_from_results(results, query_embedding, row=0):
+    """Turns row `row` of a Chroma-shaped query result into candidate dicts, best first.
+
+    Relevance is the cosine similarity to the query computed from the returned
+    embeddings, so it doesn't depend on the store's distance metric.
+    """
+    ids = results["ids"][row] if results.get("ids") else []
+    documents = results["documents"][row] if results.get("documents") else []
+    metadatas = results["metadatas"][row] if results.get("metadatas") else None
+    embeddings = results.get("embeddings")
+    embeddings = embeddings[row] if embeddings is not None and len(embeddings) > row else None
+    if embeddings is not None and len(embeddings) == len(documents) and len(documents):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        relevance = (vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))).tolist()
+    else:
+        vectors = [None] * len(documents)
+        relevance = [1.0 - i / max(len(documents), 1) for i in range(len(documents))]
+    return [
+        {"id": ids[i] if i < len(ids) else None, "text": documents[i],
+         "metadata": (metadatas[i] if metadatas else None) or {},
+         "relevance": relevance[i], "embedding": vectors[i]}
+        for i in range(len(documents))
+    ]
+
+
+def assemble_context(candidates, triples, query, token_budget=1000, max_chunks=4,
+                     lambda_mult=0.7, graph_share=0.2):
+    """Picks passages and triples for the prompt; returns (passages, triples).
+
+    `candidates` are retrieval hits as dicts with "text", "relevance" and
+    (optionally) "embedding", best first; plain strings are accepted too.
+    Triples get up to `graph_share` of the budget; whatever they leave unused
+    goes to the passages.
+    """
+    candidates = [c if isinstance(c, dict) else {"text": c} for c in candidates if c]
+    dims = {len(c["embedding"]) for c in candidates if c.get("embedding") is not None}
+    if len(dims) == 1 and all("relevance" in c for c in candidates):
+        # Lexical-only hits have no stored embedding; a zero vector means "similar to nothing"
+        zeros = np.zeros(dims.pop(), dtype=np.float32)
+        embeddings = [c["embedding"] if c.get("embedding") is not None else zeros for c in candidates]
+        picked = mmr([c["relevance"] for c in candidates], embeddings, max_chunks, lambda_mult)
+        texts = [candidates[i]["text"] for i in picked]
+    else:
+        texts = [c["text"] for c in candidates[:max_chunks]]
+    merged = merge_overlapping(texts)
+
+    ranked = rank_triples(triples, query, merged)
+    graph_triples, graph_tokens = fit_to_budget(ranked, int(token_budget * graph_share))
+    passages, _ = fit_to_budget(merged, token_budget - graph_tokens)
+    if not passages and merged:
+        # Never drop the text sources entirely: keep the start of the best passage
+        passages = [merged[0][:max(0, token_budget - graph_tokens) * 4]]
+    return passages, graph_triples
@@ -0,0 +1,211 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join("data", "embedding_cache.sqlite"))
+# Memory hits are written back to the disk tier's last_used in batches of this many
+TOUCH_BATCH_SIZE = 256
+
+
+def normalize_text(text):
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embeddings model with a two-tier cache keyed by (model, text hash).
+
+    Vectors live in an in-memory LRU backed by a SQLite file, so repeated
+    texts (and repeated student questions) skip the embedding API entirely,
+    also across restarts. Query cache keys are case-folded (the model still
+    sees the original text); documents are only whitespace-normalized.
+
+    Ingestion and the bot may share the file, so the disk tier's size is
+    kept in SQLite itself (updated by triggers) rather than counted per
+    process. When it passes max_disk_bytes, least recently used rows are
+    dropped until it is below evict_to * max_disk_bytes.
+    """
+
+    def __init__(self, embeddings, path=DEFAULT_CACHE_PATH, max_memory_items=10000,
+                 max_disk_bytes=512 * 1024 * 1024, evict_to=0.9):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.evict_to = evict_to
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._touched = {}  # key -> time of memory hits not yet written to disk
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            # Total size of the stored vectors, kept current by triggers so no one scans the table
+            self._db.execute("CREATE TABLE IF NOT EXISTS disk_size (bytes INTEGER NOT NULL)")
+            self._db.execute(
+                "INSERT INTO disk_size (bytes) SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings "
+                "WHERE NOT EXISTS (SELECT 1 FROM disk_size)"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS embeddings_insert AFTER INSERT ON embeddings "
+                "BEGIN UPDATE disk_size SET bytes = bytes + LENGTH(NEW.vector); END"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS embeddings_update AFTER UPDATE OF vector ON embeddings "
+                "BEGIN UPDATE disk_size SET bytes = bytes + LENGTH(NEW.vector) - LENGTH(OLD.vector); END"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS embeddings_delete AFTER DELETE ON embeddings "
+                "BEGIN UPDATE disk_size SET bytes = bytes - LENGTH(OLD.vector); END"
+            )
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys):
+        """Returns {key: vector} for every key found in memory or on disk."""
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self._touched[key] = time.time()
+                    self.hits += 1
+                else:
+                    missing.append(key)
+
+            if missing:
+                placeholders = ",".join("?" * len(missing))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", missing
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f", blob).tolist()
+                    found[key] = vector
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                if rows:
+                    self._db.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(time.time(), key) for key, _ in rows]
+                    )
+                    self._db.commit()
+            if len(self._touched) >= TOUCH_BATCH_SIZE:
+                self._write_touched()
+                self._db.commit()
+        return found
+
+    def _write_touched(self):
+        """Writes the last_used times of memory hits to disk, so eviction sees popular rows as recent."""
+        if self._touched:
+            self._db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                 [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+
+    def _store(self, items):
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in items]
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+            self._write_touched()
+            # Another thread or process may have stored the same text meanwhile
+            self._db.executemany(
+                "INSERT INTO embeddings (key, vector, last_used) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET vector = excluded.vector, last_used = excluded.last_used",
+                rows
+            )
+            self._evict()
+            self._db.commit()
+
+    def disk_size(self):
+        """Bytes of vectors in the disk tier, written by any process sharing the file."""
+        return self._db.execute("SELECT bytes FROM disk_size").fetchone()[0]
+
+    def _evict(self):
+        """Once the table passes max_disk_bytes, drops least recently used rows down to evict_to of it."""
+        total = self.disk_size()
+        if total <= self.max_disk_bytes:
+            return
+        excess = total - int(self.max_disk_bytes * self.evict_to)
+        freed = 0
+        stale = []
+        for key, size in self._db.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._db.executemany("DELETE FROM embeddings WHERE key = ?", stale)
+
+    def embed_documents(self, texts):
+        texts = [normalize_text(t) for t in texts]
+        keys = [self._key(t) for t in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+
+        # Embed each uncached text once, even if it repeats within the batch
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+        if pending:
+            with self._lock:
+                self.misses += len(pending)
+            vectors = self.embeddings.embed_documents(list(pending.values()))
+            new_items = list(zip(pending.keys(), vectors))
+            self._store(new_items)
+            found.update(new_items)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        text = normalize_text(text)
+        key = self._key(text.casefold())
+        found = self._lookup([key])
+        if key in found:
+            return found[key]
+        with self._lock:
+            self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        self._store([(key, vector)])
+        return vector
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_items": len(self._memory),
+            }
+
+    def close(self):
+        with self._lock:
+            self._write_touched()
+            self._db.commit()
+        self._db.close()
@@ -0,0 +1,118 @@
+import re
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+# Words that never identify an entity on their own
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "for", "from", "by", "with",
+    "is", "are", "was", "were", "be", "it", "its", "he", "she", "they", "his", "her", "their",
+    "who", "what", "when", "where", "why", "how", "which", "do", "does", "did", "me", "about",
+    "tell", "this", "that", "story", "text",
+}
+
+
+def normalize_tokens(text):
+    """Case-folds and tokenizes text, dropping a plural 's' so 'turtles' matches 'turtle'.
+
+    Stopwords are kept whole ('this' must not become 'thi'), so callers can
+    filter the result against STOPWORDS.
+    """
+    tokens = []
+    for token in TOKEN.findall(text.casefold()):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss") and token not in STOPWORDS:
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _deletes(token):
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+class EntityIndex:
+    """In-process matcher that finds known graph entity names inside a question.
+
+    Names are stored in a token trie, and the query is scanned left to right
+    taking the longest match at each position, so multi-word names like
+    "Rip Van Winkle" win over "Rip". Single-word names also tolerate one typo
+    via a precomputed deletion neighbourhood. No network or LLM call is made.
+    """
+
+    def __init__(self, names=(), min_fuzzy_length=5):
+        self.min_fuzzy_length = min_fuzzy_length
+        self.build(names)
+
+    def build(self, names):
+        """(Re)builds the index; the new tables are swapped in only when complete."""
+        trie = {}
+        fuzzy = {}
+        count = 0
+        for name in names:
+            tokens = normalize_tokens(name or "")
+            if not tokens or all(t in STOPWORDS for t in tokens):
+                continue
+            node = trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node.setdefault(None, []).append(name)
+            count += 1
+            if len(tokens) == 1 and len(tokens[0]) >= self.min_fuzzy_length:
+                for variant in _deletes(tokens[0]) | {tokens[0]}:
+                    fuzzy.setdefault(variant, set()).add(tokens[0])
+        self._trie, self._fuzzy, self._size = trie, fuzzy, count
+
+    def __len__(self):
+        return self._size
+
+    def _fuzzy_lookup(self, fuzzy, token):
+        if len(token) < self.min_fuzzy_length:
+            return []
+        candidates = set()
+        for variant in _deletes(token) | {token}:
+            candidates.update(fuzzy.get(variant, ()))
+        # Deletion neighbourhoods can pair tokens two edits apart; keep edit distance 1
+        return [c for c in sorted(candidates) if c != token and _within_one_edit(token, c)]
+
+    def match(self, query):
+        """Returns the entity names mentioned in query, in order of appearance."""
+        trie, fuzzy = self._trie, self._fuzzy
+        tokens = normalize_tokens(query)
+        found = []
+        i = 0
+        while i < len(tokens):
+            node = trie
+            longest = None
+            j = i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if None in node:
+                    longest = (j, node[None])
+            if longest:
+                i, names = longest
+                found.extend(names)
+                continue
+            if tokens[i] not in STOPWORDS:
+                for candidate in self._fuzzy_lookup(fuzzy, tokens[i]):
+                    found.extend(trie[candidate][None])
+            i += 1
+        return list(dict.fromkeys(found))
+
+
+def _within_one_edit(a, b):
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        return sum(x != y for x, y in zip(a, b)) == 1
+    if len(a) > len(b):
+        a, b = b, a
+    for i in range(len(b)):
+        if a == b[:i] + b[i + 1:]:
+            return True
+    return False
+
+
+def load_entity_names(driver):
+    """Fetches every Entity.name from Neo4j."""
+    with driver.session() as session:
+        return [record["name"] for record in session.run("MATCH (n:Entity) RETURN n.name AS name")]
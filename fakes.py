@@ -0,0 +1,192 @@
+"""Offline stand-ins for the OpenAI models, used by tests and benchmarks."""
+import hashlib
+import json
+import math
+import re
+import time
+from typing import Any, Callable, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+CAPITALIZED_WORD = re.compile(r"\b[A-Z][a-z]{2,}\b")
+
+
+def _entities(text):
+    seen = []
+    for word in CAPITALIZED_WORD.findall(text):
+        if word not in seen:
+            seen.append(word)
+    return seen
+
+
+def default_responder(prompt):
+    """Deterministic replies for the prompts used by ingest_data and RAGBot."""
+    if "Extract knowledge graph" in prompt:
+        names = _entities(prompt.split("Extract knowledge graph from this text:", 1)[1])[:6]
+        nodes = [{"name": n, "type": "Concept"} for n in names]
+        edges = [
+            {"source": a, "target": b, "relationship": "related_to"}
+            for a, b in zip(names, names[1:])
+        ]
+        return json.dumps({"nodes": nodes, "edges": edges})
+    if "comma-separated list" in prompt:
+        return ", ".join(_entities(prompt.rsplit(":", 1)[-1])) or "none"
+    return f"Answer based on {len(prompt)} characters of context."
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that sleeps for `latency` seconds and answers deterministically.
+
+    `responder` maps the flattened prompt text to the reply; it may raise to
+    simulate API failures.
+    """
+    latency: float = 0.0
+    responder: Optional[Callable[[str], str]] = None
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _reply(self, messages):
+        """Returns (reply, usage) with ~4 characters per token, like OpenAI's usage report."""
+        self.calls += 1
+        time.sleep(self.latency)
+        prompt = "\n".join(str(m.content) for m in messages)
+        reply = (self.responder or default_responder)(prompt)
+        usage = {"input_tokens": len(prompt) // 4, "output_tokens": len(reply) // 4}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return reply, usage
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        reply, usage = self._reply(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply, usage_metadata=usage))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        # `latency` is spent before the first token, like a real model's prefill
+        reply, usage = self._reply(messages)
+        for token in re.findall(r"\S+\s*", reply):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings: texts sharing words get similar vectors."""
+
+    def __init__(self, size=64, latency=0.0):
+        self.model = "fake-embedding"
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def _embed(self, text):
+        vector = [0.0] * self.size
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[digest[0] % self.size] += 1.0 if digest[1] % 2 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        time.sleep(self.latency)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class FakeNeo4jResult(list):
+    def consume(self):
+        return None
+
+
+class FakeNeo4jTransaction:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def run(self, query, **params):
+        return FakeNeo4jResult(self.driver.run(query, params))
+
+
+class FakeNeo4jSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        return self.driver.run(query, params)
+
+    def execute_write(self, work, *args, **kwargs):
+        self.driver.transactions += 1
+        return work(FakeNeo4jTransaction(self.driver), *args, **kwargs)
+
+
+class FakeNeo4jDriver:
+    """In-memory stand-in for the Neo4j driver, answering the queries this repo sends.
+
+    Queries are recognised by their parameters rather than parsed: graph writes
+    (nodes/edges), chunk pruning (chunk_ids), graph search (questions), the
+    entity-name listing and the edge export. Each run() sleeps for `latency` seconds;
+    `queries` and `transactions` count run() calls and write transactions.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.nodes = {}
+        self.edges = {}  # (source, type, target) -> set of chunk ids
+        self.queries = 0
+        self.transactions = 0
+
+    def session(self, **kwargs):
+        return FakeNeo4jSession(self)
+
+    def close(self):
+        pass
+
+    def verify_connectivity(self):
+        time.sleep(self.latency)
+
+    def run(self, query, params):
+        self.queries += 1
+        time.sleep(self.latency)
+        if "chunk_ids" in params:
+            for key in list(self.edges):
+                self.edges[key] -= set(params["chunk_ids"])
+                if not self.edges[key]:
+                    del self.edges[key]
+            return []
+        if "nodes" in params or "edges" in params:
+            for node in params.get("nodes", []):
+                self.nodes[node["name"]] = node.get("type")
+            for edge in params.get("edges", []):
+                self.nodes.setdefault(edge["source"], None)
+                self.nodes.setdefault(edge["target"], None)
+                key = (edge["source"], edge["relationship"], edge["target"])
+                self.edges.setdefault(key, set()).update(edge["chunk_ids"])
+            return []
+        if "questions" in params:
+            records = []
+            for question in params["questions"]:
+                wanted = [e.strip('"').lower() for e in question["entities"]]
+                matches = [{"index": question["index"], "source": source, "type": rel_type, "target": target}
+                           for source, rel_type, target in self.edges
+                           if any(w in source.lower() or w in target.lower() for w in wanted)]
+                records.extend(matches[:params.get("limit", len(matches))])
+            return records
+        if "n.name AS name" in query:
+            return [{"name": name} for name in self.nodes]
+        if "AS source" in query:
+            return [{"source": source, "type": rel_type, "target": target}
+                    for source, rel_type, target in self.edges]
+        return []
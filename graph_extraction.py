@@ -0,0 +1,136 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class RateLimiter:
+    """Token-bucket limiter for requests-per-minute and tokens-per-minute quotas.
+
+    Either limit may be None to disable it. Safe to share between threads.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = float(requests_per_minute or 0)
+        self._token_allowance = float(tokens_per_minute or 0)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.requests_per_minute:
+            self._request_allowance = min(
+                self.requests_per_minute,
+                self._request_allowance + elapsed * self.requests_per_minute / 60.0
+            )
+        if self.tokens_per_minute:
+            self._token_allowance = min(
+                self.tokens_per_minute,
+                self._token_allowance + elapsed * self.tokens_per_minute / 60.0
+            )
+
+    def acquire(self, tokens=0):
+        """Blocks until one request costing `tokens` tokens fits in both quotas."""
+        if self.tokens_per_minute:
+            # A single request larger than the whole minute's quota would never fit
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill()
+                wait = 0.0
+                if self.requests_per_minute and self._request_allowance < 1:
+                    wait = max(wait, (1 - self._request_allowance) * 60.0 / self.requests_per_minute)
+                if self.tokens_per_minute and self._token_allowance < tokens:
+                    wait = max(wait, (tokens - self._token_allowance) * 60.0 / self.tokens_per_minute)
+                if wait == 0.0:
+                    if self.requests_per_minute:
+                        self._request_allowance -= 1
+                    if self.tokens_per_minute:
+                        self._token_allowance -= tokens
+                    return
+            time.sleep(wait)
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English text)."""
+    return max(1, len(text) // 4)
+
+
+def _invoke_with_retry(chain, inputs, limiter, token_cost, max_retries, backoff):
+    attempt = 0
+    while True:
+        limiter.acquire(token_cost)
+        try:
+            return chain.invoke(inputs)
+        except Exception:
+            if attempt >= max_retries:
+                raise
+            # Exponential backoff with jitter so retries from many workers spread out
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+            attempt += 1
+
+
+def iter_graph_extractions(chain, texts, format_instructions="", max_workers=8,
+                           requests_per_minute=None, tokens_per_minute=None,
+                           max_retries=3, backoff=1.0):
+    """Runs `chain` over every text concurrently and yields results as they finish.
+
+    `texts` may be any iterable, including a generator fed by an earlier
+    pipeline stage: at most 2 * max_workers texts are pulled ahead of the
+    results, so memory stays bounded however long the input is.
+
+    Yields (index, graph_data, error) tuples in completion order. A chunk that
+    still fails after `max_retries` retries is yielded with graph_data=None and
+    the exception, so one bad chunk never aborts the rest of the run.
+    """
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    texts = iter(texts)
+    exhausted = False
+    next_index = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        while True:
+            while not exhausted and len(futures) < 2 * max_workers:
+                try:
+                    text = next(texts)
+                except StopIteration:
+                    exhausted = True
+                    break
+                inputs = {"text": text, "format_instructions": format_instructions}
+                token_cost = estimate_tokens(text) + estimate_tokens(format_instructions)
+                future = executor.submit(
+                    _invoke_with_retry, chain, inputs, limiter, token_cost, max_retries, backoff
+                )
+                futures[future] = next_index
+                next_index += 1
+
+            if not futures:
+                return
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures.pop(future)
+                try:
+                    yield i, future.result(), None
+                except Exception as e:
+                    yield i, None, e
+
+
+def extract_graphs(chain, texts, **kwargs):
+    """Like iter_graph_extractions, but returns (results, errors) in input order.
+
+    `results[i]` is the graph data for texts[i] (None if it failed) and
+    `errors` maps each failed index to its exception.
+    """
+    results = [None] * len(texts)
+    errors = {}
+    for i, graph_data, error in iter_graph_extractions(chain, texts, **kwargs):
+        if error is not None:
+            errors[i] = error
+        else:
+            results[i] = graph_data
+    return results, errors
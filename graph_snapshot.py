@@ -0,0 +1,178 @@
+"""In-memory snapshot of the knowledge graph, so graph search needs no Neo4j round-trip.
+
+ingest_data.py exports every Entity node and RELATED edge after each run. The
+snapshot is array-backed: entity names are interned to ids, relationship
+types to codes, and each edge is (source id, type code, target id). Edges are
+indexed per entity in CSR layout (an offsets array into one flat array of edge
+ids, listing every edge under both of its endpoints), so an entity's
+neighbourhood is a slice. On disk: a compressed .npz with the edge arrays and
+a JSON sidecar with the names and types; the CSR index is rebuilt on load.
+"""
+import json
+import os
+
+import numpy as np
+
+from entity_index import STOPWORDS, normalize_tokens
+from vector_store import save_with_sidecar
+
+GRAPH_SNAPSHOT_PATH = os.getenv("GRAPH_SNAPSHOT_PATH", os.path.join("data", "graph_snapshot"))
+
+EXPORT_NODES_CYPHER = "MATCH (n:Entity) RETURN n.name AS name"
+EXPORT_EDGES_CYPHER = """
+MATCH (a:Entity)-[r:RELATED]->(b:Entity)
+RETURN a.name AS source, r.type AS type, b.name AS target
+"""
+
+# Score of an edge reached through a neighbour rather than the matched entity itself,
+# and of an edge found only by its relationship type (as in GRAPH_SEARCH_CYPHER)
+HOP_DECAY = 0.5
+RELATION_MATCH_SCORE = 0.5
+
+
+class GraphSnapshot:
+    """Read-only adjacency over the exported graph."""
+
+    def __init__(self, names, types, edge_source, edge_type, edge_target):
+        self.names = list(names)
+        self.types = list(types)
+        self.edge_source = np.asarray(edge_source, dtype=np.int32)
+        self.edge_type = np.asarray(edge_type, dtype=np.int32)
+        self.edge_target = np.asarray(edge_target, dtype=np.int32)
+        if not len(self.edge_source) == len(self.edge_type) == len(self.edge_target):
+            raise ValueError("Edge arrays differ in length.")
+
+        # CSR: the edges touching entity i are edges[offsets[i]:offsets[i + 1]]
+        m = len(self.edge_source)
+        ends = np.concatenate([self.edge_source, self.edge_target])
+        order = np.argsort(ends, kind="stable")
+        self.edges = np.concatenate([np.arange(m), np.arange(m)])[order].astype(np.int32)
+        self.offsets = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ends, minlength=len(self.names)), out=self.offsets[1:])
+
+        self._ids = {}
+        self._by_token = {}
+        for i, name in enumerate(self.names):
+            self._ids.setdefault(name.casefold(), i)
+            for token in set(normalize_tokens(name)):
+                self._by_token.setdefault(token, []).append(i)
+        self._type_tokens = [set(normalize_tokens(t or "")) for t in self.types]
+
+    def __len__(self):
+        return len(self.edge_source)
+
+    @classmethod
+    def from_triples(cls, triples, names=()):
+        """Builds a snapshot from (source, type, target) triples plus any edgeless entity names."""
+        ids, types = {}, {}
+        edges = []
+        for name in names:
+            ids.setdefault(name, len(ids))
+        for source, rel_type, target in dict.fromkeys(tuple(t) for t in triples):
+            edges.append((ids.setdefault(source, len(ids)), types.setdefault(rel_type, len(types)),
+                          ids.setdefault(target, len(ids))))
+        columns = np.array(edges, dtype=np.int32).reshape(-1, 3)
+        return cls(list(ids), list(types), columns[:, 0], columns[:, 1], columns[:, 2])
+
+    # --- persistence -------------------------------------------------------
+
+    @classmethod
+    def load(cls, path=GRAPH_SNAPSHOT_PATH):
+        """The saved snapshot, or None if ingestion hasn't exported one."""
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with np.load(os.path.join(path, "edges.npz")) as edges:
+            source, rel_type, target = edges["source"], edges["type"], edges["target"]
+        if len(source) != meta["edges"]:
+            raise ValueError(f"Graph snapshot at {path} is inconsistent; re-run ingest_data.py.")
+        return cls(meta["names"], meta["types"], source, rel_type, target)
+
+    def save(self, path=GRAPH_SNAPSHOT_PATH):
+        edges = {"source": self.edge_source, "type": self.edge_type, "target": self.edge_target}
+        save_with_sidecar(path, {"edges.npz": edges}, {"names": self.names, "types": self.types, "edges": len(self)})
+
+    # --- lookups -----------------------------------------------------------
+
+    def triple(self, edge):
+        return (self.names[self.edge_source[edge]], self.types[self.edge_type[edge]],
+                self.names[self.edge_target[edge]])
+
+    def find(self, entity, limit=3):
+        """Up to `limit` (entity id, score) pairs for a name: an exact match scores 1.0,
+        otherwise names containing all of its words, scored by the share of words matched."""
+        exact = self._ids.get(entity.casefold())
+        if exact is not None:
+            return [(exact, 1.0)]
+        tokens = set(normalize_tokens(entity)) - STOPWORDS
+        if not tokens:
+            return []
+        candidates = set.intersection(*(set(self._by_token.get(t, ())) for t in tokens))
+        scored = sorted(((i, len(tokens) / max(len(normalize_tokens(self.names[i])), 1)) for i in candidates),
+                        key=lambda hit: (-hit[1], hit[0]))
+        return scored[:limit]
+
+    def neighbourhood(self, seeds, hops=1):
+        """Edges within `hops` of the seed entities as {edge id: score}.
+
+        `seeds` maps entity id -> score; edges one step further out score
+        HOP_DECAY times less.
+        """
+        scores = {}
+        frontier = dict(seeds)
+        visited = set(frontier)
+        for _ in range(hops):
+            reached = {}
+            for node, score in frontier.items():
+                for edge in self.edges[self.offsets[node]:self.offsets[node + 1]].tolist():
+                    if scores.get(edge, -1.0) < score:
+                        scores[edge] = score
+                    other = int(self.edge_target[edge] if self.edge_source[edge] == node else self.edge_source[edge])
+                    if other not in visited:
+                        reached[other] = max(reached.get(other, 0.0), score * HOP_DECAY)
+            visited.update(reached)
+            frontier = reached
+        return scores
+
+    def search(self, entities, words=(), nodes_per_entity=3, limit=15, hops=1):
+        """Triples for a question, best first: the neighbourhoods of its entities plus edges
+        whose relationship type starts with one of its words."""
+        seeds = {}
+        for entity in entities:
+            for node, score in self.find(entity, nodes_per_entity):
+                seeds[node] = max(seeds.get(node, 0.0), score)
+        scores = self.neighbourhood(seeds, hops)
+
+        prefixes = tuple(words)
+        if prefixes:
+            codes = [code for code, tokens in enumerate(self._type_tokens)
+                     if any(t.startswith(prefixes) for t in tokens)]
+            for edge in np.flatnonzero(np.isin(self.edge_type, codes)).tolist():
+                if scores.get(edge, -1.0) < RELATION_MATCH_SCORE:
+                    scores[edge] = RELATION_MATCH_SCORE
+
+        ranked = sorted(scores, key=lambda edge: (-scores[edge], edge))[:limit]
+        return [self.triple(edge) for edge in ranked]
+
+
+def export_graph_snapshot(driver, path=GRAPH_SNAPSHOT_PATH):
+    """Reads every Entity and RELATED edge from Neo4j and saves them as a snapshot.
+
+    If the export fails, the old snapshot is removed so RAGBot falls back to
+    querying Neo4j instead of answering from a stale copy.
+    """
+    try:
+        with driver.session() as session:
+            names = [record["name"] for record in session.run(EXPORT_NODES_CYPHER)]
+            triples = [(record["source"], record["type"], record["target"])
+                       for record in session.run(EXPORT_EDGES_CYPHER)]
+        snapshot = GraphSnapshot.from_triples(triples, names)
+        snapshot.save(path)
+        return snapshot
+    except Exception:
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        raise
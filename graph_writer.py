@@ -0,0 +1,104 @@
+"""Bulk writes of extracted graphs to Neo4j.
+
+Extractions from many chunks are merged in memory first: entity names that
+differ only in case or spacing become one entity (spelled as first seen, or as
+already stored in the graph), relationship types are normalized to snake_case
+and repeated edges collapse into one row listing every chunk that supports
+it. The merged rows are then written with UNWIND in explicit write
+transactions of a bounded size, all nodes before any edges.
+"""
+
+NODES_CYPHER = """
+UNWIND $nodes AS node
+MERGE (n:Entity {name: node.name})
+SET n.type = coalesce(node.type, n.type)
+"""
+
+# Endpoints are written by NODES_CYPHER first, so edges only MATCH them
+EDGES_CYPHER = """
+UNWIND $edges AS edge
+MATCH (a:Entity {name: edge.source})
+MATCH (b:Entity {name: edge.target})
+MERGE (a)-[r:RELATED {type: edge.relationship}]->(b)
+SET r.chunks = coalesce(r.chunks, []) + [c IN edge.chunk_ids WHERE NOT c IN coalesce(r.chunks, [])]
+"""
+
+
+def normalize_name(name):
+    """Collapses runs of whitespace; '' for a missing name."""
+    return " ".join(str(name or "").split())
+
+
+def normalize_relationship(relationship):
+    """'Part of' / 'PART_OF' / 'part  of' -> 'part_of'."""
+    return "_".join(str(relationship or "").replace("-", " ").split()).lower()
+
+
+def _write_rows(tx, query, key, rows):
+    tx.run(query, **{key: rows}).consume()
+
+
+class GraphWriteBuffer:
+    """Extracted graphs of several chunks, merged for one bulk write.
+
+    `known_names` (e.g. the names already in Neo4j) fix the spelling an
+    entity is written under. The name table is kept across flushes, so a
+    whole ingestion run agrees on one spelling per entity.
+    """
+
+    def __init__(self, known_names=()):
+        self._spellings = {}  # casefolded name -> spelling written to the graph
+        for name in known_names:
+            self.canonical(name)
+        self.clear()
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    def clear(self):
+        self.nodes = {}       # name -> type (None if unknown)
+        self.edges = {}       # (source, relationship, target) -> supporting chunk ids
+        self.chunk_ids = []
+
+    def canonical(self, name):
+        name = normalize_name(name)
+        if not name:
+            return None
+        return self._spellings.setdefault(name.casefold(), name)
+
+    def add(self, chunk_id, graph_data):
+        """Adds one chunk's extraction ({"nodes": [...], "edges": [...]})."""
+        for node in graph_data.get("nodes") or []:
+            name = self.canonical(node.get("name"))
+            if name and not self.nodes.get(name):
+                self.nodes[name] = node.get("type") or None
+        for edge in graph_data.get("edges") or []:
+            source, target = self.canonical(edge.get("source")), self.canonical(edge.get("target"))
+            relationship = normalize_relationship(edge.get("relationship"))
+            # Self-loops usually come from two spellings of one entity; they add nothing
+            if not (source and target and relationship) or source == target:
+                continue
+            self.nodes.setdefault(source, None)
+            self.nodes.setdefault(target, None)
+            supporting = self.edges.setdefault((source, relationship, target), [])
+            if chunk_id not in supporting:
+                supporting.append(chunk_id)
+        self.chunk_ids.append(chunk_id)
+
+    def flush(self, session, batch_size=1000):
+        """Writes the buffer (nodes, then edges) in transactions of at most `batch_size` rows.
+
+        Returns the chunk ids written. The buffer is emptied even if a write
+        fails; those chunks stay unmarked in the manifest and are retried on
+        the next run.
+        """
+        try:
+            nodes = [{"name": name, "type": type_} for name, type_ in self.nodes.items()]
+            edges = [{"source": source, "relationship": relationship, "target": target, "chunk_ids": chunk_ids}
+                     for (source, relationship, target), chunk_ids in self.edges.items()]
+            for query, key, rows in ((NODES_CYPHER, "nodes", nodes), (EDGES_CYPHER, "edges", edges)):
+                for start in range(0, len(rows), batch_size):
+                    session.execute_write(_write_rows, query, key, rows[start:start + batch_size])
+            return self.chunk_ids
+        finally:
+            self.clear()
@@ -1,9 +1,10 @@
 import os
 import json
-import chromadb
-from chromadb.config import Settings
+import contextvars
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
@@ -11,23 +12,43 @@ from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
 from typing import List
 from neo4j import GraphDatabase
+from embedding_cache import CachedEmbeddings
+from entity_index import load_entity_names
+from graph_extraction import iter_graph_extractions
+from graph_snapshot import GRAPH_SNAPSHOT_PATH, export_graph_snapshot
+from graph_writer import GraphWriteBuffer
+from ingest_manifest import IngestManifest, chunk_id, write_corpus_version
+from lexical_index import BM25Index
+from pdf_pages import PDF_PARSE_WORKERS, find_pdfs, iter_pdf_pages
+from tracing import add, span, start_trace
+from vector_store import VECTOR_STORE, open_vector_store
 
 load_dotenv()
 
 # Configuration
 PDF_PATH = os.path.join("data", "textbook.pdf")
+MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", os.path.join("data", "ingest_manifest.json"))
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# ChromaDB Config
-CHROMA_API_KEY = os.getenv("CHROMADB_API_KEY")
-CHROMA_TENANT = os.getenv("CHROMADB_TENANT")
-CHROMA_DATABASE = os.getenv("CHROMADB_DATABASE")
-
 # Neo4j Config
 NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USERNAME = os.getenv("NEO4J_USERNAME")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 
+# Graph Extraction Config (concurrency and OpenAI rate limits)
+GRAPH_EXTRACTION_WORKERS = int(os.getenv("GRAPH_EXTRACTION_WORKERS", "8"))
+GRAPH_EXTRACTION_RPM = int(os.getenv("GRAPH_EXTRACTION_RPM", "500"))
+GRAPH_EXTRACTION_TPM = int(os.getenv("GRAPH_EXTRACTION_TPM", "30000"))
+GRAPH_EXTRACTION_RETRIES = int(os.getenv("GRAPH_EXTRACTION_RETRIES", "3"))
+
+# Streaming pipeline: chunks per embedding/upsert batch (and per bulk graph write), and
+# chunks buffered between stages
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "100"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "500"))
+
+# Rows (nodes or edges) per Neo4j write transaction
+GRAPH_WRITE_BATCH_SIZE = int(os.getenv("GRAPH_WRITE_BATCH_SIZE", "1000"))
+
 # Define Output Structures for Graph Extraction
 class GraphEdge(BaseModel):
     source: str = Field(description="The source node name")
@@ -42,109 +63,315 @@ class GraphExtraction(BaseModel):
     nodes: List[GraphNode]
     edges: List[GraphEdge]
 
-def ingest_data():
-    if not os.path.exists(PDF_PATH):
-        print(f"Error: {PDF_PATH} not found.")
-        return
-    
-    print("Loading PDF...")
-    loader = PyPDFLoader(PDF_PATH)
-    docs = loader.load()
-    
-    # Split text
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(docs)
-    print(f"Split into {len(splits)} chunks.")
+# Detach removed chunks from their edges; an edge no chunk supports any more is deleted
+PRUNE_CYPHER = """
+MATCH ()-[r:RELATED]->()
+WHERE any(c IN coalesce(r.chunks, []) WHERE c IN $chunk_ids)
+SET r.chunks = [c IN r.chunks WHERE NOT c IN $chunk_ids]
+WITH r WHERE size(r.chunks) = 0
+DELETE r
+"""
 
-    # 1. Vector Store Ingestion (ChromaDB)
-    print("Ingesting into ChromaDB...")
-    try:
-        # Initialize Chroma Client
-        client = chromadb.CloudClient(
-            api_key=CHROMA_API_KEY,
-            tenant=CHROMA_TENANT,
-            database=CHROMA_DATABASE
-        )
-        
-        # Get or Create Collection
-        collection = client.get_or_create_collection(name="textbook_rag")
-        
-        # Prepare data for Chroma
-        ids = [f"chunk_{i}" for i in range(len(splits))]
-        documents = [s.page_content for s in splits]
-        metadatas = [s.metadata for s in splits]
-        
-        # Generate Embeddings manually or let Chroma do it? 
-        # Chroma Cloud usually requires embeddings or an embedding function.
-        # We will use OpenAI Embeddings via LangChain wrapper to generate them, 
-        # OR pass the embedding function to Chroma.
-        # Let's generate them to be safe and explicit.
-        embeddings_model = OpenAIEmbeddings(model="text-embedding-3-small")
-        embeddings = embeddings_model.embed_documents(documents)
-        
-        # Add to collection (batching is better for large datasets, but this is small)
-        batch_size = 100
-        for i in range(0, len(documents), batch_size):
-            end = min(i + batch_size, len(documents))
-            collection.add(
-                ids=ids[i:end],
-                documents=documents[i:end],
-                embeddings=embeddings[i:end],
-                metadatas=metadatas[i:end]
-            )
-        print("ChromaDB ingestion complete.")
-        
-    except Exception as e:
-        print(f"ChromaDB ingestion failed: {e}")
-        return
-
-    # 2. Knowledge Graph Ingestion (Neo4j)
-    print("Ingesting into Neo4j...")
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
+def build_graph_chain(llm):
+    """Returns the (prompt | llm | parser) extraction chain and its parser."""
     parser = JsonOutputParser(pydantic_object=GraphExtraction)
     prompt = ChatPromptTemplate.from_messages([
         ("system", "You are an expert at extracting knowledge graphs. Extract key entities and relationships."),
         ("user", "Extract knowledge graph from this text:\n{text}\n\n{format_instructions}")
     ])
-    graph_chain = prompt | llm | parser
+    return prompt | llm | parser, parser
+
+def ingest_data(pdf_paths=(PDF_PATH,), full=False):
+    """Ingests one or more PDFs (or directories of PDFs) incrementally.
+
+    Pages are parsed in a process pool and streamed through ingest_documents,
+    so memory stays flat however many textbooks are ingested in one run. The
+    vector store, models and Neo4j driver are shared across all of them.
+    """
+    if isinstance(pdf_paths, str):
+        pdf_paths = [pdf_paths]
+    paths = find_pdfs(pdf_paths)
+    if not paths:
+        print("Error: no PDFs to ingest.")
+        return
 
+    trace = start_trace("ingest")
+    try:
+        print(f"Ingesting into vector store ({VECTOR_STORE})...")
+        collection = open_vector_store(create=True)
+    except Exception as e:
+        print(f"Vector store ingestion failed: {e}")
+        return
+    embeddings_model = CachedEmbeddings(OpenAIEmbeddings(model="text-embedding-3-small"))
+    llm = ChatOpenAI(model="gpt-4o", temperature=0)
+    lexical_index = BM25Index()
     try:
         driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD))
-        
-        with driver.session() as session:
-            for i, split in enumerate(splits):
-                # Process every 5th chunk for demo speed/cost
-                if i % 5 == 0:
-                    try:
-                        print(f"Extracting graph from chunk {i}...")
-                        content = split.page_content
-                        graph_data = graph_chain.invoke({"text": content, "format_instructions": parser.get_format_instructions()})
-                        
-                        # Cypher query to merge nodes and relationships
-                        cypher_query = """
-                        UNWIND $nodes AS node
-                        MERGE (n:Entity {name: node.name})
-                        SET n.type = node.type
-                        
-                        WITH 1 as dummy
-                        UNWIND $edges AS edge
-                        MERGE (a:Entity {name: edge.source})
-                        MERGE (b:Entity {name: edge.target})
-                        MERGE (a)-[r:RELATED {type: edge.relationship}]->(b)
-                        """
-                        
-                        session.run(cypher_query, 
-                                    nodes=graph_data.get('nodes', []),
-                                    edges=graph_data.get('edges', [])
-                        )
-                    except Exception as e:
-                        print(f"Error processing chunk {i} for graph: {e}")
-                        
-        driver.close()
-        print("Neo4j ingestion complete.")
-        
     except Exception as e:
         print(f"Neo4j connection failed: {e}")
+        driver = None
+
+    try:
+        with ProcessPoolExecutor(max_workers=PDF_PARSE_WORKERS) as pool:
+            for n, path in enumerate(paths, 1):
+                print(f"[{n}/{len(paths)}] Loading {path}...")
+                ingest_documents(iter_pdf_pages(path, pool), path, full=full,
+                                 embeddings_model=embeddings_model, collection=collection,
+                                 llm=llm, driver=driver, lexical_index=lexical_index)
+    finally:
+        if driver is not None:
+            driver.close()
+    trace.finish()
+    print(trace.format())
+
+_END = object()
+
+def _drain(q):
+    """Yields items from a stage queue until the end marker."""
+    while True:
+        item = q.get()
+        if item is _END:
+            return
+        yield item
+
+def _start_stage(target, *args):
+    # Each stage thread gets its own copy of the context so spans land in the current trace
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(target, *args), daemon=True)
+    thread.start()
+    return thread
+
+def _write_vectors(batch, collection, embeddings_model, manifest, stats):
+    ids = [c for c, _ in batch]
+    documents = [split.page_content for _, split in batch]
+    with span("ingest.embed"):
+        embeddings = embeddings_model.embed_documents(documents)
+    with span("ingest.store_write"):
+        collection.upsert(
+            ids=ids,
+            documents=documents,
+            embeddings=embeddings,
+            metadatas=[split.metadata for _, split in batch]
+        )
+    add("ingest.chunks_embedded", len(ids))
+    stats["embedded"] += len(ids)
+    # Progress is recorded after every batch, so a crashed run resumes from the last one
+    manifest.mark_embedded(ids)
+    manifest.save()
+
+def _vector_stage(chunks, collection, embeddings_model, manifest, stats, failures):
+    """Embeds and upserts (chunk_id, split) items in batches of INGEST_BATCH_SIZE."""
+    try:
+        batch = []
+        for item in chunks:
+            batch.append(item)
+            if len(batch) >= INGEST_BATCH_SIZE:
+                _write_vectors(batch, collection, embeddings_model, manifest, stats)
+                batch = []
+        if batch:
+            _write_vectors(batch, collection, embeddings_model, manifest, stats)
+    except Exception as e:
+        failures["vector"] = e
+    # Keep consuming after a failure so the producer never blocks on a full queue
+    for _ in chunks:
+        pass
+
+def _write_graph(buffer, session, manifest, stats):
+    count = len(buffer)
+    try:
+        with span("ingest.graph_write"):
+            written = buffer.flush(session, GRAPH_WRITE_BATCH_SIZE)
+    except Exception as e:
+        add("ingest.graph_failures", count)
+        print(f"Error writing {count} chunks to graph: {e}")
+        return
+    add("ingest.chunks_graphed", len(written))
+    stats["graphed"] += len(written)
+    manifest.mark_graphed(written)
+    manifest.save()
+
+def _graph_stage(chunks, driver, graph_chain, parser, manifest, stats, failures):
+    """Extracts the graph of (chunk_id, text) items as they arrive and writes it in bulk,
+    every INGEST_BATCH_SIZE chunks."""
+    pending = {}
+
+    def texts():
+        for i, (cid, text) in enumerate(chunks):
+            pending[i] = cid
+            yield text
+
+    try:
+        if driver is None:
+            raise failures.get("graph") or RuntimeError("no Neo4j driver")
+        # Existing spellings win, so re-ingesting doesn't add case variants of known entities
+        buffer = GraphWriteBuffer(load_entity_names(driver))
+        with driver.session() as session, span("ingest.graph"):
+            extractions = iter_graph_extractions(
+                graph_chain,
+                texts(),
+                format_instructions=parser.get_format_instructions(),
+                max_workers=GRAPH_EXTRACTION_WORKERS,
+                requests_per_minute=GRAPH_EXTRACTION_RPM,
+                tokens_per_minute=GRAPH_EXTRACTION_TPM,
+                max_retries=GRAPH_EXTRACTION_RETRIES
+            )
+            # Extraction runs in worker threads; writes stay on this session's thread
+            for i, graph_data, error in extractions:
+                cid = pending.pop(i)
+                if error is not None:
+                    add("ingest.graph_failures")
+                    print(f"Error processing chunk {cid} for graph: {error}")
+                    continue
+                buffer.add(cid, graph_data)
+                if len(buffer) >= INGEST_BATCH_SIZE:
+                    _write_graph(buffer, session, manifest, stats)
+            if len(buffer):
+                _write_graph(buffer, session, manifest, stats)
+    except Exception as e:
+        failures["graph"] = e
+    for _ in chunks:
+        pass
+
+def ingest_documents(docs, source, full=False, embeddings_model=None, collection=None,
+                     llm=None, driver=None, manifest_path=MANIFEST_PATH, lexical_index=None,
+                     graph_snapshot_path=GRAPH_SNAPSHOT_PATH):
+    """Streams documents through split -> embed -> store and split -> graph extraction.
+
+    `docs` may be any iterable (e.g. the page generator from iter_pdf_pages);
+    it is consumed once. The stages run concurrently in their own threads,
+    joined by queues of at most INGEST_QUEUE_SIZE chunks, so a slow stage
+    holds back page parsing instead of letting chunks pile up in memory. Only
+    chunk IDs are kept for the whole source, to diff it against the manifest.
+    Chunks are also added to the local BM25 lexical index as they are split,
+    and the graph is exported to an in-memory snapshot for RAGBot when it changed.
+
+    The model, store, driver and index arguments default to the configured
+    OpenAI, vector store, Neo4j and lexical index; pass stand-ins to run offline.
+    """
+    manifest = IngestManifest(manifest_path)
+    manifest.use_vector_store(VECTOR_STORE)
+
+    try:
+        if collection is None:
+            print(f"Ingesting into vector store ({VECTOR_STORE})...")
+            collection = open_vector_store(create=True)
+        else:
+            print(f"Ingesting into vector store ({type(collection).__name__})...")
+    except Exception as e:
+        print(f"Vector store ingestion failed: {e}")
+        return
+    if embeddings_model is None:
+        embeddings_model = CachedEmbeddings(OpenAIEmbeddings(model="text-embedding-3-small"))
+    if llm is None:
+        llm = ChatOpenAI(model="gpt-4o", temperature=0)
+    graph_chain, parser = build_graph_chain(llm)
+    if lexical_index is None:
+        lexical_index = BM25Index()
+
+    failures = {}
+    own_driver = driver is None
+    if own_driver:
+        try:
+            driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD))
+        except Exception as e:
+            failures["graph"] = e
+
+    stats = {"embedded": 0, "graphed": 0, "indexed": 0}
+    embed_queue = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+    graph_queue = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+    stages = [
+        _start_stage(_vector_stage, _drain(embed_queue), collection, embeddings_model, manifest, stats, failures),
+        _start_stage(_graph_stage, _drain(graph_queue), driver, graph_chain, parser, manifest, stats, failures),
+    ]
+
+    # Content-hash IDs: an edit only changes the IDs of the chunks it touches.
+    # Identical chunks (e.g. repeated headers) collapse to one entry.
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    ids = []
+    seen = set()
+    splits = 0
+    print("Streaming chunks to the vector store and Neo4j...")
+    try:
+        for doc in docs:
+            for split in text_splitter.split_documents([doc]):
+                splits += 1
+                cid = chunk_id(split.page_content)
+                if cid in seen:
+                    continue
+                seen.add(cid)
+                ids.append(cid)
+                if full or cid not in lexical_index:
+                    lexical_index.add([cid], [split.page_content], [split.metadata])
+                    stats["indexed"] += 1
+                if full or manifest.needs_embedding(cid):
+                    embed_queue.put((cid, split))
+                if full or manifest.needs_graph(cid):
+                    graph_queue.put((cid, split.page_content))
+    finally:
+        embed_queue.put(_END)
+        graph_queue.put(_END)
+        for stage in stages:
+            stage.join()
+
+    stale = manifest.stale(source, ids)
+    print(f"Split into {splits} chunks ({len(ids)} unique): {stats['embedded']} embedded, "
+          f"{stats['graphed']} graph-extracted, {stats['indexed']} indexed, {len(stale)} to remove.")
+    add("ingest.chunks", len(ids))
+    add("ingest.chunks_removed", len(stale))
+
+    # The lexical index is local, so stale chunks can always be dropped from it
+    try:
+        lexical_index.remove(stale)
+        lexical_index.save()
+    except Exception as e:
+        print(f"Lexical index update failed: {e}")
+
+    if "vector" not in failures and stale:
+        try:
+            collection.delete(ids=stale)
+        except Exception as e:
+            failures["vector"] = e
+    if "vector" in failures:
+        print(f"Vector store ingestion failed: {failures['vector']}")
+    else:
+        print("Vector store ingestion complete.")
+
+    if "graph" not in failures and stale:
+        try:
+            with driver.session() as session:
+                session.run(PRUNE_CYPHER, chunk_ids=stale)
+        except Exception as e:
+            failures["graph"] = e
+    if "graph" in failures:
+        print(f"Neo4j connection failed: {failures['graph']}")
+    else:
+        print("Neo4j ingestion complete.")
+
+    # Written before the corpus version, which is what tells RAGBot to reload it
+    snapshot_missing = not os.path.exists(os.path.join(graph_snapshot_path, "meta.json"))
+    if "graph" not in failures and (stats["graphed"] or stale or snapshot_missing):
+        try:
+            with span("ingest.graph_snapshot"):
+                snapshot = export_graph_snapshot(driver, graph_snapshot_path)
+            print(f"Graph snapshot saved ({len(snapshot.names)} entities, {len(snapshot)} relationships).")
+        except Exception as e:
+            print(f"Graph snapshot export failed: {e}")
+
+    # The source's chunk list only moves forward once stale chunks are gone
+    # from both stores, so an interrupted run re-prunes on resume.
+    if not failures:
+        manifest.set_source(source, ids)
+        manifest.forget(stale)
+    manifest.save()
+    if own_driver and driver is not None:
+        driver.close()
+    if stats["embedded"] or stats["graphed"] or stats["indexed"] or stale or snapshot_missing:
+        write_corpus_version()
 
 if __name__ == "__main__":
-    ingest_data()
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Ingest textbook PDFs into the vector store and Neo4j.")
+    arg_parser.add_argument("pdfs", nargs="*", default=[PDF_PATH], help="PDF files or directories of PDFs")
+    arg_parser.add_argument("--full", action="store_true", help="ignore the manifest and re-ingest every chunk")
+    args = arg_parser.parse_args()
+    ingest_data(args.pdfs, full=args.full)
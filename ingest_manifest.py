@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+
+# Stamp rewritten whenever ingestion changes the corpus; readers use it to drop stale caches
+CORPUS_VERSION_PATH = os.getenv("CORPUS_VERSION_PATH", os.path.join("data", "corpus_version"))
+
+
+def chunk_id(text):
+    """Stable ID derived from the chunk's content, so unchanged chunks keep their ID."""
+    normalized = re.sub(r"\s+", " ", text).strip()
+    return "chunk_" + hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:24]
+
+
+def write_corpus_version(path=CORPUS_VERSION_PATH):
+    """Records a fresh corpus version and returns it."""
+    version = uuid.uuid4().hex
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+
+def read_corpus_version(path=CORPUS_VERSION_PATH):
+    """Returns the current corpus version, or None if nothing was ingested locally."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+class IngestManifest:
+    """Local record of which chunks are already embedded and graph-extracted.
+
+    Stored as JSON next to the data so a re-run (or a resumed crashed run) only
+    pays for chunks that changed. Layout:
+
+        {"vector_store": name,
+         "sources": {pdf_path: [chunk_id, ...]},
+         "chunks": {chunk_id: {"embedded": bool, "graph": bool}}}
+
+    Safe to update from several pipeline stages at once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.vector_store = None
+        self.sources = {}
+        self.chunks = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.vector_store = data.get("vector_store")
+            self.sources = data.get("sources", {})
+            self.chunks = data.get("chunks", {})
+        self._lock = threading.Lock()
+
+    def save(self):
+        """Writes the manifest atomically so a crash never leaves it half-written."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self._lock, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"vector_store": self.vector_store, "sources": self.sources, "chunks": self.chunks}, f)
+            os.replace(tmp_path, self.path)
+
+    def plan(self, source, ids):
+        """Diffs a source's current chunk IDs against the manifest.
+
+        Returns (to_embed, to_extract, stale): IDs still needing embedding, IDs
+        still needing graph extraction, and IDs that were previously ingested
+        from this source but no longer appear in it (and in no other source).
+        """
+        to_embed = [i for i in ids if self.needs_embedding(i)]
+        to_extract = [i for i in ids if self.needs_graph(i)]
+        return to_embed, to_extract, self.stale(source, ids)
+
+    def needs_embedding(self, chunk_id):
+        return not self.chunks.get(chunk_id, {}).get("embedded")
+
+    def needs_graph(self, chunk_id):
+        return not self.chunks.get(chunk_id, {}).get("graph")
+
+    def stale(self, source, ids):
+        """IDs previously ingested from `source` that are no longer among `ids` (nor in another source)."""
+        current = set(ids)
+        still_used = set()
+        for other, other_ids in self.sources.items():
+            if other != source:
+                still_used.update(other_ids)
+        return [i for i in self.sources.get(source, []) if i not in current and i not in still_used]
+
+    def use_vector_store(self, name):
+        """Switching vector store backends means every chunk must be embedded again."""
+        if self.vector_store != name:
+            for record in self.chunks.values():
+                record["embedded"] = False
+            self.vector_store = name
+
+    def set_source(self, source, ids):
+        with self._lock:
+            self.sources[source] = list(ids)
+            for i in ids:
+                self.chunks.setdefault(i, {"embedded": False, "graph": False})
+
+    def mark_embedded(self, ids):
+        with self._lock:
+            for i in ids:
+                self.chunks.setdefault(i, {"embedded": False, "graph": False})["embedded"] = True
+
+    def mark_graphed(self, ids):
+        with self._lock:
+            for i in ids:
+                self.chunks.setdefault(i, {"embedded": False, "graph": False})["graph"] = True
+
+    def forget(self, ids):
+        with self._lock:
+            for i in ids:
+                self.chunks.pop(i, None)
@@ -0,0 +1,201 @@
+"""Local BM25 index over the ingested chunks, for hybrid and embedding-free retrieval.
+
+Built during ingestion next to the vector store. Each chunk is stored as its
+term ids and term frequencies; on disk these are flat numpy arrays with an
+offsets array (CSR layout) in a compressed .npz, plus a JSON sidecar with the
+vocabulary, chunk ids, texts and metadata. On load the postings are inverted
+with one stable argsort, so a query only touches the postings of its terms.
+Searching needs no network call.
+"""
+import json
+import math
+import os
+import threading
+from collections import Counter
+
+import numpy as np
+
+from entity_index import STOPWORDS, normalize_tokens
+from vector_store import save_with_sidecar
+
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join("data", "lexical_index"))
+
+
+def tokenize(text):
+    return [t for t in normalize_tokens(text) if t not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuses ranked lists of candidate dicts (keyed by "id") by summing 1 / (k + rank).
+
+    Returns the candidates best first, each with "relevance" rescaled so the
+    top one is 1.0. A candidate's other fields come from the first list that
+    has it; a missing embedding is filled from a later list.
+    """
+    scores = {}
+    merged = {}
+    for ranking in rankings:
+        for rank, candidate in enumerate(ranking, 1):
+            key = candidate["id"]
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            if key not in merged:
+                merged[key] = dict(candidate)
+            elif merged[key].get("embedding") is None and candidate.get("embedding") is not None:
+                merged[key]["embedding"] = candidate["embedding"]
+    if not scores:
+        return []
+    order = sorted(scores, key=scores.get, reverse=True)
+    top = scores[order[0]]
+    return [dict(merged[key], relevance=scores[key] / top) for key in order]
+
+
+class BM25Index:
+    """Okapi BM25 over chunk texts with add/remove by chunk id.
+
+    Mirrors LocalVectorStore: call add()/remove() while ingesting, then
+    save(); RAGBot loads it read-only and reloads when the corpus changes.
+    """
+
+    def __init__(self, path=LEXICAL_INDEX_PATH, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        self._vocab = {}     # term -> term id
+        self._terms = []     # per chunk: (term ids, term frequencies)
+        self._index = {}     # chunk id -> row
+        self._inverted = None
+        self._load()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self._index
+
+    # --- persistence -------------------------------------------------------
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        meta_path = self._file("meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.ids = meta["ids"]
+        self.documents = meta["documents"]
+        self.metadatas = meta["metadatas"]
+        self._vocab = {term: i for i, term in enumerate(meta["vocab"])}
+        with np.load(self._file("postings.npz")) as postings:
+            offsets, term_ids, tfs = postings["offsets"], postings["term_ids"], postings["tfs"]
+        if len(offsets) != len(self.ids) + 1:
+            raise ValueError(f"Lexical index at {self.path} is inconsistent; re-run ingestion with --full.")
+        self._terms = [(term_ids[offsets[i]:offsets[i + 1]], tfs[offsets[i]:offsets[i + 1]])
+                       for i in range(len(self.ids))]
+        self._index = {id_: row for row, id_ in enumerate(self.ids)}
+
+    def save(self):
+        with self._lock:
+            lengths = [len(term_ids) for term_ids, _ in self._terms]
+            offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            term_ids = np.concatenate([t for t, _ in self._terms]) if self._terms else np.zeros(0, np.int32)
+            tfs = np.concatenate([f for _, f in self._terms]) if self._terms else np.zeros(0, np.uint16)
+            postings = {"offsets": offsets, "term_ids": term_ids.astype(np.int32), "tfs": tfs.astype(np.uint16)}
+            vocab = sorted(self._vocab, key=self._vocab.get)
+            save_with_sidecar(self.path, {"postings.npz": postings},
+                              {"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas,
+                               "vocab": vocab})
+
+    # --- updates -----------------------------------------------------------
+
+    def _encode(self, text):
+        counts = Counter(tokenize(text))
+        term_ids = np.fromiter((self._vocab.setdefault(t, len(self._vocab)) for t in counts),
+                               dtype=np.int32, count=len(counts))
+        tfs = np.fromiter((min(c, 65535) for c in counts.values()), dtype=np.uint16, count=len(counts))
+        return term_ids, tfs
+
+    def add(self, ids, documents, metadatas=None):
+        """Indexes chunks; an id that is already present is replaced."""
+        metadatas = metadatas or [{} for _ in ids]
+        with self._lock:
+            for id_, text, metadata in zip(ids, documents, metadatas):
+                encoded = self._encode(text)
+                row = self._index.get(id_)
+                if row is None:
+                    self._index[id_] = len(self.ids)
+                    self.ids.append(id_)
+                    self.documents.append(text)
+                    self.metadatas.append(metadata or {})
+                    self._terms.append(encoded)
+                else:
+                    self.documents[row] = text
+                    self.metadatas[row] = metadata or {}
+                    self._terms[row] = encoded
+            self._inverted = None
+
+    def remove(self, ids):
+        with self._lock:
+            drop = {self._index[i] for i in ids if i in self._index}
+            if not drop:
+                return
+            keep = [row for row in range(len(self.ids)) if row not in drop]
+            self.ids = [self.ids[row] for row in keep]
+            self.documents = [self.documents[row] for row in keep]
+            self.metadatas = [self.metadatas[row] for row in keep]
+            self._terms = [self._terms[row] for row in keep]
+            self._index = {id_: row for row, id_ in enumerate(self.ids)}
+            self._inverted = None
+
+    # --- search ------------------------------------------------------------
+
+    def _build_inverted(self):
+        """Term-major postings: (term offsets, chunk rows, term frequencies, chunk lengths)."""
+        lengths = np.array([int(f.sum()) for _, f in self._terms], dtype=np.float32)
+        if not self._terms:
+            return np.zeros(len(self._vocab) + 1, np.int64), np.zeros(0, np.int64), np.zeros(0, np.float32), lengths
+        term_ids = np.concatenate([t for t, _ in self._terms])
+        tfs = np.concatenate([f for _, f in self._terms]).astype(np.float32)
+        rows = np.repeat(np.arange(len(self._terms)), [len(t) for t, _ in self._terms])
+        order = np.argsort(term_ids, kind="stable")
+        offsets = np.zeros(len(self._vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(self._vocab)), out=offsets[1:])
+        return offsets, rows[order], tfs[order], lengths
+
+    def search(self, query, k=10):
+        """Top-k chunks by BM25, as candidate dicts with relevance scaled to the best hit."""
+        with self._lock:
+            if self._inverted is None:
+                self._inverted = self._build_inverted()
+            offsets, rows, tfs, lengths = self._inverted
+            ids, documents, metadatas = self.ids, self.documents, self.metadatas
+            term_ids = [self._vocab[t] for t in dict.fromkeys(tokenize(query)) if t in self._vocab]
+        n = len(ids)
+        if not n or not term_ids:
+            return []
+
+        scores = np.zeros(n, dtype=np.float32)
+        norm = self.k1 * (1.0 - self.b + self.b * lengths / max(float(lengths.mean()), 1.0))
+        for term in term_ids:
+            start, stop = offsets[term], offsets[term + 1]
+            if start == stop:
+                continue
+            hits, tf = rows[start:stop], tfs[start:stop]
+            idf = math.log(1.0 + (n - len(hits) + 0.5) / (len(hits) + 0.5))
+            scores[hits] += idf * tf * (self.k1 + 1.0) / (tf + norm[hits])
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        k = min(k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]] if k < len(matched) else matched
+        top = top[np.argsort(-scores[top])]
+        best = float(scores[top[0]])
+        return [{"id": ids[r], "text": documents[r], "metadata": metadatas[r],
+                 "relevance": float(scores[r]) / best, "embedding": None} for r in top]
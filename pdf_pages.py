@@ -0,0 +1,78 @@
+"""Page-by-page PDF text extraction, parsed in a process pool.
+
+pypdf's text extraction is pure Python and CPU-bound, so pages are parsed in
+worker processes a few at a time. iter_pdf_pages yields them in page order
+while keeping only a small window of page batches in flight, so memory stays
+flat however large (or however many) the textbooks are.
+"""
+import os
+from collections import deque
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+from tracing import span
+
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
+
+def find_pdfs(paths):
+    """Expands directories into the PDFs under them; missing paths are reported and skipped."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in sorted(os.walk(path)):
+                found.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.lower().endswith(".pdf"))
+        elif os.path.exists(path):
+            found.append(path)
+        else:
+            print(f"Error: {path} not found.")
+    return found
+
+
+def parse_pages(path, start, stop):
+    """Returns [(page_number, text)] for pages start..stop-1; runs in a worker process."""
+    reader = PdfReader(path)
+    return [(n, reader.pages[n].extract_text() or "") for n in range(start, stop)]
+
+
+def iter_pdf_pages(path, executor=None, pages_per_task=PDF_PAGES_PER_TASK, max_pending=None):
+    """Yields one Document per page of `path`, in order.
+
+    With an executor (normally a ProcessPoolExecutor shared across PDFs), at
+    most `max_pending` batches of `pages_per_task` pages are parsed ahead of
+    the consumer; without one, pages are parsed in this process.
+    """
+    total = len(PdfReader(path).pages)
+    ranges = [(start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task)]
+    if max_pending is None:
+        max_pending = 2 * PDF_PARSE_WORKERS
+
+    def to_documents(pages):
+        for n, text in pages:
+            yield Document(page_content=text, metadata={"source": path, "page": n, "total_pages": total})
+
+    if executor is None:
+        for start, stop in ranges:
+            with span("ingest.load_pdf"):
+                pages = parse_pages(path, start, stop)
+            yield from to_documents(pages)
+        return
+
+    pending = deque()
+    try:
+        for start, stop in ranges:
+            pending.append(executor.submit(parse_pages, path, start, stop))
+            if len(pending) >= max_pending:
+                with span("ingest.load_pdf"):
+                    pages = pending.popleft().result()
+                yield from to_documents(pages)
+        while pending:
+            with span("ingest.load_pdf"):
+                pages = pending.popleft().result()
+            yield from to_documents(pages)
+    finally:
+        for future in pending:
+            future.cancel()
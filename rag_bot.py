@@ -1,116 +1,942 @@
 import os
-import chromadb
+import asyncio
+import concurrent.futures
+import contextvars
+import math
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain.memory import ConversationBufferMemory
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from neo4j import GraphDatabase
+from answer_cache import SemanticAnswerCache, history_key
+from context_builder import assemble_context, candidates_from_results
+from embedding_cache import CachedEmbeddings
+from entity_index import STOPWORDS, EntityIndex, load_entity_names, normalize_tokens
+from graph_extraction import estimate_tokens
+from graph_snapshot import GraphSnapshot
+from ingest_manifest import read_corpus_version
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from session_memory import SessionMemoryStore
+from setup_database import ENTITY_FULLTEXT_INDEX, RELATION_FULLTEXT_INDEX
+from tracing import add, current_trace, span, start_trace
+from vector_store import LocalVectorStore, open_vector_store
 
 load_dotenv()
 
+# Per-branch retrieval timeouts (seconds); a branch that overruns is dropped from the context
+VECTOR_SEARCH_TIMEOUT = float(os.getenv("VECTOR_SEARCH_TIMEOUT", "10"))
+GRAPH_SEARCH_TIMEOUT = float(os.getenv("GRAPH_SEARCH_TIMEOUT", "5"))
+
+# How graph_search finds entities in a question:
+#   "local"     - in-process EntityIndex over the graph's entity names (no LLM call)
+#   "local+llm" - local first, falling back to the LLM when nothing matches
+#   "llm"       - always ask the LLM (the original behaviour)
+ENTITY_EXTRACTION = os.getenv("ENTITY_EXTRACTION", "local")
+
+# Graph retrieval caps: candidate nodes per entity and total triples returned
+GRAPH_NODES_PER_ENTITY = int(os.getenv("GRAPH_NODES_PER_ENTITY", "3"))
+GRAPH_RESULT_LIMIT = int(os.getenv("GRAPH_RESULT_LIMIT", "15"))
+
+# Answer graph lookups from the in-memory snapshot exported by ingest_data.py (Neo4j is
+# only queried when there is none), and how many hops out from a matched entity to look
+GRAPH_SNAPSHOT = os.getenv("GRAPH_SNAPSHOT", "1") == "1"
+GRAPH_HOPS = int(os.getenv("GRAPH_HOPS", "1"))
+
+# One round-trip for any number of questions: per question, full-text index hits for its
+# entity names plus relationship types matching its words, ranked by Lucene score.
+# $questions is a list of {index, entities, relation_terms}; rows come back tagged with index.
+GRAPH_SEARCH_CYPHER = f"""
+UNWIND $questions AS question
+CALL {{
+    WITH question
+    CALL {{
+        WITH question
+        UNWIND question.entities AS entity
+        CALL db.index.fulltext.queryNodes('{ENTITY_FULLTEXT_INDEX}', entity) YIELD node, score
+        WITH entity, node, score ORDER BY score DESC
+        WITH entity, collect({{node: node, score: score}})[..$nodes_per_entity] AS hits
+        UNWIND hits AS hit
+        WITH hit.node AS n, hit.score AS score
+        MATCH (n)-[r:RELATED]-(:Entity)
+        RETURN r, score
+      UNION ALL
+        WITH question
+        UNWIND [t IN [question.relation_terms] WHERE t <> ''] AS terms
+        CALL db.index.fulltext.queryRelationships('{RELATION_FULLTEXT_INDEX}', terms) YIELD relationship, score
+        RETURN relationship AS r, score * 0.5 AS score
+    }}
+    WITH r, max(score) AS score
+    ORDER BY score DESC
+    LIMIT $limit
+    RETURN startNode(r).name AS source, r.type AS type, endNode(r).name AS target
+}}
+RETURN question.index AS index, source, type, target
+"""
+
+# Used when the full-text indexes are missing (setup_database.py not re-run yet)
+GRAPH_SEARCH_FALLBACK_CYPHER = """
+UNWIND $questions AS question
+CALL {
+    WITH question
+    UNWIND question.entities AS entity
+    MATCH (a:Entity)-[r:RELATED]->(b:Entity)
+    WHERE a.name CONTAINS entity OR b.name CONTAINS entity
+    WITH DISTINCT a, r, b
+    RETURN a.name AS source, r.type AS type, b.name AS target
+    LIMIT $limit
+}
+RETURN question.index AS index, source, type, target
+"""
+
+def lucene_phrase(text):
+    """Quotes text as a Lucene phrase, escaping the characters that would break the query."""
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def relation_words(query):
+    """The question's content words, matched as prefixes of relationship types."""
+    return list(dict.fromkeys(t for t in normalize_tokens(query) if t not in STOPWORDS and len(t) > 2))
+
+def relation_terms(query):
+    """Prefix query over the question's content words, e.g. 'friend* OR help*'."""
+    return " OR ".join(f"{t}*" for t in relation_words(query))
+
+# Context assembly: vector candidates fetched, chunks kept after MMR (maximal marginal
+# relevance), MMR relevance/diversity trade-off (1.0 = relevance only), token budget for
+# the whole context and the share of it graph triples may use
+VECTOR_CANDIDATES = int(os.getenv("VECTOR_CANDIDATES", "12"))
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "4"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+CONTEXT_GRAPH_SHARE = float(os.getenv("CONTEXT_GRAPH_SHARE", "0.2"))
+
+# Hybrid retrieval: BM25 over the local lexical index, fused with vector hits by reciprocal
+# rank fusion. If the question embedding fails or takes over EMBEDDING_TIMEOUT seconds, text
+# retrieval uses the lexical index alone and embedding is skipped for EMBEDDING_RETRY_AFTER seconds.
+LEXICAL_SEARCH = os.getenv("LEXICAL_SEARCH", "1") == "1"
+LEXICAL_CANDIDATES = int(os.getenv("LEXICAL_CANDIDATES", "12"))
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "3"))
+EMBEDDING_RETRY_AFTER = float(os.getenv("EMBEDDING_RETRY_AFTER", "30"))
+
+# Semantic answer cache: similarity needed for a hit, entry lifetime (seconds), size (0 disables)
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+
+# Per-session conversation memory: token budget for the history window, optional running
+# summary of older turns (costs one LLM call when the window overflows), idle eviction (seconds)
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "1500"))
+MEMORY_SUMMARY = os.getenv("MEMORY_SUMMARY", "0") == "1"
+MEMORY_IDLE_TTL = float(os.getenv("MEMORY_IDLE_TTL", "3600"))
+
+# Neo4j connections kept open by the driver's pool, and how long health checks may take (seconds)
+NEO4J_POOL_SIZE = int(os.getenv("NEO4J_POOL_SIZE", "20"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "5"))
+
+# generate_batch: answer LLM calls in flight at once
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# Shared pool for blocking retrieval calls. Not the loop's default executor, so a
+# timed-out branch left running never delays asyncio.run() from returning. A question
+# runs up to three branches at once (graph, lexical, vector) and time spent queued for a
+# thread counts against a branch's timeout, so keep RETRIEVAL_WORKERS at least 3x the
+# questions answered concurrently (SERVER_MAX_CONCURRENCY in server.py).
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "48"))
+RETRIEVAL_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS,
+                                                           thread_name_prefix="retrieval")
+
+SYSTEM_PROMPT = """You are a helpful educational assistant for Class 6 English.
+        Answer the user's question using ONLY the provided context. 
+        If the answer is not in the context, say "I cannot find the answer in the textbook."
+        
+        Combine information from both the text sources and the knowledge graph to provide a complete answer.
+        """
+
+def fuse_hits(vector_hits, lexical_hits):
+    """Merges vector and lexical hits by reciprocal rank fusion when both found something."""
+    if vector_hits and lexical_hits:
+        return reciprocal_rank_fusion([vector_hits, lexical_hits])
+    return vector_hits or lexical_hits
+
+def is_client_error(error):
+    """True for a Neo4j ClientError (e.g. a missing index); neo4j is only imported once one is raised."""
+    from neo4j.exceptions import ClientError
+    return isinstance(error, ClientError)
+
+def run_sync(coro):
+    """Runs a coroutine to completion from sync code, even if a loop is already running."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # Called from inside an event loop (e.g. a notebook): run on a fresh loop in a worker thread
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
 class RAGBot:
-    def __init__(self):
-        # ChromaDB Config
-        self.chroma_client = chromadb.CloudClient(
-            api_key=os.getenv("CHROMADB_API_KEY"),
-            tenant=os.getenv("CHROMADB_TENANT"),
-            database=os.getenv("CHROMADB_DATABASE")
+    def __init__(self, collection=None, neo4j_driver=None, embeddings=None, llm=None):
+        """Sets up the bot without touching the network.
+
+        The vector store, Neo4j driver, embedding model and chat model are
+        created on first use (or all at once by warmup()), so constructing a
+        bot is fast and never fails because a backend is unreachable. Any of
+        them can be passed in instead (the benchmark and tests use offline
+        stand-ins).
+        """
+        self._clients = {}
+        # One lock per client, so warmup() can create them all at the same time
+        self._client_locks = {name: threading.Lock() for name in
+                              ("collection", "neo4j_driver", "embeddings", "llm", "lexical_index",
+                                        "graph_snapshot")}
+        for name, client in (("collection", collection), ("neo4j_driver", neo4j_driver),
+                             ("embeddings", embeddings), ("llm", llm)):
+            if client is not None:
+                self._clients[name] = client
+
+        # One history per session_id, so concurrent users sharing this bot stay separate
+        self.memory = SessionMemoryStore(
+            max_tokens=MEMORY_MAX_TOKENS,
+            summarizer=self.summarize_history if MEMORY_SUMMARY else None,
+            idle_ttl=MEMORY_IDLE_TTL
         )
-        self.collection = self.chroma_client.get_collection(name="textbook_rag")
-        
-        # Neo4j Config
-        self.neo4j_driver = GraphDatabase.driver(
-            os.getenv("NEO4J_URI"), 
-            auth=(os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD"))
+        self.answer_cache = SemanticAnswerCache(
+            threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_SIZE
         )
-        
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-        self.llm = ChatOpenAI(model="gpt-4o", temperature=0)
-        self.memory = ConversationBufferMemory(return_messages=True)
 
-    def vector_search(self, query, k=3):
-        """Retrieves relevant text chunks using ChromaDB."""
-        try:
-            query_embedding = self.embeddings.embed_query(query)
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=k
+        # Most recent request trace per session, for the app's debug panel
+        self.traces = OrderedDict()
+
+        # Entity names are loaded from the graph on first use; the BM25 index and graph
+        # snapshot are loaded on first use. All three (and a local vector store) are
+        # reloaded whenever ingestion stamps a new corpus version.
+        self.entity_index = EntityIndex()
+        self._entity_index_loaded = False
+        self._entity_index_lock = threading.Lock()
+        self._corpus_lock = threading.Lock()
+        self.corpus_version = read_corpus_version()
+        self._embedding_retry_at = 0.0
+
+    # --- lazily created clients --------------------------------------------
+
+    def _client(self, name, factory):
+        """Returns the named client, creating it on first use; a failed creation is retried next time."""
+        if name not in self._clients:
+            with self._client_locks[name]:
+                if name not in self._clients:
+                    self._clients[name] = factory()
+        return self._clients[name]
+
+    @property
+    def collection(self):
+        # Vector store: Chroma Cloud or the embedded local store (VECTOR_STORE)
+        return self._client("collection", open_vector_store)
+
+    @collection.setter
+    def collection(self, value):
+        self._clients["collection"] = value
+
+    @property
+    def neo4j_driver(self):
+        def connect():
+            from neo4j import GraphDatabase
+            # The driver pools connections; sessions borrow one per query
+            return GraphDatabase.driver(
+                os.getenv("NEO4J_URI"),
+                auth=(os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD")),
+                max_connection_pool_size=NEO4J_POOL_SIZE
             )
-            # Chroma returns list of lists
-            return results['documents'][0] if results['documents'] else []
+        return self._client("neo4j_driver", connect)
+
+    @neo4j_driver.setter
+    def neo4j_driver(self, value):
+        self._clients["neo4j_driver"] = value
+
+    @property
+    def embeddings(self):
+        def create():
+            from langchain_openai import OpenAIEmbeddings
+            return CachedEmbeddings(OpenAIEmbeddings(model="text-embedding-3-small"))
+        return self._client("embeddings", create)
+
+    @embeddings.setter
+    def embeddings(self, value):
+        self._clients["embeddings"] = value
+
+    @property
+    def llm(self):
+        def create():
+            from langchain_openai import ChatOpenAI
+            # stream_usage makes streamed answers report token counts for tracing
+            return ChatOpenAI(model="gpt-4o", temperature=0, stream_usage=True)
+        return self._client("llm", create)
+
+    @llm.setter
+    def llm(self, value):
+        self._clients["llm"] = value
+
+    @property
+    def lexical_index(self):
+        return self._client("lexical_index", self._load_lexical_index)
+
+    @lexical_index.setter
+    def lexical_index(self, value):
+        self._clients["lexical_index"] = value
+
+    @property
+    def graph_snapshot(self):
+        return self._client("graph_snapshot", self._load_graph_snapshot)
+
+    @graph_snapshot.setter
+    def graph_snapshot(self, value):
+        self._clients["graph_snapshot"] = value
+
+    # --- warm-up and health ------------------------------------------------
+
+    def _ping_graph(self):
+        self.neo4j_driver.verify_connectivity()
+        return "connected"
+
+    def _embeddings_status(self):
+        paused = self._embedding_retry_at - time.monotonic()
+        if paused > 0:
+            raise RuntimeError(f"paused after a failure, retrying in {paused:.0f}s")
+        # Past the cache, or a cached probe would report healthy with the API down
+        model = self.embeddings
+        if isinstance(model, CachedEmbeddings):
+            model = model.embeddings
+        return f"{len(model.embed_query('health check'))} dimensions"
+
+    def _llm_status(self):
+        self.answer_prompt()
+        llm = self.llm
+        client = getattr(llm, "root_client", None)
+        if client is not None:
+            # OpenAI: looking the model up checks the key and the API without using tokens
+            client.models.retrieve(llm.model_name)
+        else:
+            llm.invoke("Reply with OK.", max_tokens=1)
+        return type(llm).__name__
+
+    def _lexical_status(self):
+        size = len(self.lexical_index or ())
+        if not size:
+            raise RuntimeError("empty; run ingest_data.py")
+        return f"{size} chunks"
+
+    def _graph_snapshot_status(self):
+        snapshot = self.graph_snapshot
+        if snapshot is None:
+            raise RuntimeError("not exported; run ingest_data.py (graph search uses Neo4j)")
+        return f"{len(snapshot.names)} entities, {len(snapshot)} relationships"
+
+    def _health_checks(self):
+        return {
+            "vector_store": lambda: f"{self.collection.count()} chunks",
+            "graph": self._ping_graph,
+            "embeddings": self._embeddings_status,
+            "llm": self._llm_status,
+            "lexical_index": self._lexical_status,
+            "graph_snapshot": self._graph_snapshot_status,
+        }
+
+    def _run_checks(self, checks):
+        """Runs the checks in parallel, each bounded by HEALTH_CHECK_TIMEOUT."""
+        def timed(check):
+            start = time.perf_counter()
+            detail = check()
+            return detail, time.perf_counter() - start
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(checks), thread_name_prefix="health")
+        futures = {name: executor.submit(contextvars.copy_context().run, timed, check)
+                   for name, check in checks.items()}
+        report = {}
+        for name, future in futures.items():
+            try:
+                detail, seconds = future.result(timeout=HEALTH_CHECK_TIMEOUT)
+                report[name] = {"ok": True, "latency_ms": 1000 * seconds, "detail": str(detail)}
+            except concurrent.futures.TimeoutError:
+                report[name] = {"ok": False, "latency_ms": None, "detail": f"no answer in {HEALTH_CHECK_TIMEOUT}s"}
+            except Exception as e:
+                report[name] = {"ok": False, "latency_ms": None, "detail": str(e)}
+        # Don't wait for checks that timed out
+        executor.shutdown(wait=False)
+
+        text_retrieval = (report["vector_store"]["ok"] and report["embeddings"]["ok"]) or report["lexical_index"]["ok"]
+        return {"ok": report["llm"]["ok"] and text_retrieval, "checks": report}
+
+    def health(self):
+        """Checks every backend in parallel.
+
+        Returns {"ok": bool, "checks": {name: {"ok", "latency_ms", "detail"}}}.
+        "ok" means questions can be answered: the chat model API answered a
+        probe and text can be retrieved by vector search (the embedding API
+        answered too) or from the lexical index. The graph is optional;
+        without it answers just lack graph context.
+        """
+        return self._run_checks(self._health_checks())
+
+    def warmup(self):
+        """Opens every connection in parallel so the first question doesn't pay for it.
+
+        Also embeds a probe question (opening the OpenAI connection) and loads
+        the entity index. Returns the same report as health().
+        """
+        checks = self._health_checks()
+        checks["embeddings"] = lambda: f"{len(self.embeddings.embed_query('warm-up'))} dimensions"
+        if ENTITY_EXTRACTION != "llm":
+            checks["entity_index"] = lambda: f"{self.refresh_entity_index()} names"
+        return self._run_checks(checks)
+
+    def summarize_history(self, summary, messages):
+        """Folds messages that left the memory window into the running summary."""
+        from langchain_core.prompts import ChatPromptTemplate
+        transcript = "\n".join(f"{m.type}: {m.content}" for m in messages)
+        prompt = ChatPromptTemplate.from_template(
+            "Update this summary of a student's conversation with a textbook assistant. "
+            "Keep it under 100 words.\n\nCurrent summary: {summary}\n\nNew messages:\n{transcript}"
+        )
+        return (prompt | self.llm).invoke({"summary": summary or "(none)", "transcript": transcript}).content
+
+    def refresh_entity_index(self):
+        """Reloads the local entity matcher from the graph snapshot, or Neo4j without one."""
+        try:
+            snapshot = self.graph_snapshot
+            names = snapshot.names if snapshot is not None else load_entity_names(self.neo4j_driver)
+            self.entity_index.build(names)
+        except Exception as e:
+            print(f"Entity index refresh failed: {e}")
+        self._entity_index_loaded = True
+        return len(self.entity_index)
+
+    def _load_lexical_index(self):
+        if not LEXICAL_SEARCH:
+            return None
+        try:
+            return BM25Index()
+        except Exception as e:
+            print(f"Lexical index load failed: {e}")
+            return None
+
+    def refresh_lexical_index(self):
+        """Reloads the BM25 index written by ingest_data.py."""
+        self.lexical_index = self._load_lexical_index()
+        return len(self.lexical_index or ())
+
+    def _load_graph_snapshot(self):
+        if not GRAPH_SNAPSHOT:
+            return None
+        try:
+            return GraphSnapshot.load()
+        except Exception as e:
+            print(f"Graph snapshot load failed: {e}")
+            return None
+
+    def refresh_graph_snapshot(self):
+        """Reloads the graph snapshot written by ingest_data.py."""
+        self.graph_snapshot = self._load_graph_snapshot()
+        return len(self.graph_snapshot or ())
+
+    def _sync_corpus_version(self):
+        """Reloads the local indexes if ingestion stamped a new corpus version; returns the version.
+
+        Reads from disk, so async callers run it in the retrieval pool (_acorpus_version).
+        """
+        version = read_corpus_version()
+        if version != self.corpus_version:
+            # Concurrent questions wait for one reload instead of each doing it
+            with self._corpus_lock:
+                if version != self.corpus_version:
+                    # Chroma serves the new chunks itself; the local store must re-read its files
+                    collection = self._clients.get("collection")
+                    if isinstance(collection, LocalVectorStore):
+                        collection.reload()
+                    self.refresh_lexical_index()
+                    self.refresh_graph_snapshot()
+                    if self._entity_index_loaded:
+                        self.refresh_entity_index()
+                    self.corpus_version = version
+        # The first question loads the lexical index here rather than on the event loop
+        self.lexical_index
+        return version
+
+    async def _acorpus_version(self):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(RETRIEVAL_EXECUTOR, contextvars.copy_context().run,
+                                          self._sync_corpus_version)
+
+    def lexical_search(self, query, k=LEXICAL_CANDIDATES):
+        """Retrieves chunks by BM25 from the local index; no network call."""
+        index = self.lexical_index
+        if index is None:
+            return []
+        with span("lexical_search"):
+            hits = index.search(query, k)
+        add("retrieved.lexical", len(hits))
+        return hits
+
+    def vector_search(self, query, k=VECTOR_CANDIDATES, query_embedding=None):
+        """Retrieves candidate text chunks from the vector store, best first.
+
+        Each hit is a dict with the chunk's id, text, metadata, stored embedding
+        and cosine relevance to the query; build_context narrows them down.
+        """
+        try:
+            if query_embedding is None:
+                with span("vector_search.embed_query"):
+                    query_embedding = self.embeddings.embed_query(query)
+            return self.vector_search_batch([query_embedding], k)[0]
         except Exception as e:
             print(f"Vector search failed: {e}")
             return []
 
-    def graph_search(self, query):
-        """Retrieves relevant graph triples based on entities in the query."""
-        # 1. Extract entities from query
+    def vector_search_batch(self, query_embeddings, k=VECTOR_CANDIDATES):
+        """Candidates for several question embeddings from one collection.query call, in order."""
+        with span("vector_search.query"):
+            results = self.collection.query(
+                query_embeddings=list(query_embeddings),
+                n_results=k,
+                include=["documents", "metadatas", "embeddings"]
+            )
+        # Results are Chroma-shaped: one list per query embedding
+        hits = [candidates_from_results(results, embedding, row=i) for i, embedding in enumerate(query_embeddings)]
+        add("retrieved.chunks", sum(len(h) for h in hits))
+        return hits
+
+    def llm_extract_entities(self, query):
+        """Asks the LLM for the entities in the query (slow; used as a fallback)."""
+        from langchain_core.prompts import ChatPromptTemplate
         extraction_prompt = ChatPromptTemplate.from_template(
             "Extract the main entities (nouns, proper nouns) from this query as a comma-separated list: {query}"
         )
         chain = extraction_prompt | self.llm
-        entities_str = chain.invoke({"query": query}).content
-        entities = [e.strip() for e in entities_str.split(',')]
-        
-        triples = []
+        response = chain.invoke({"query": query})
+        current_trace().add_usage(response)
+        entities_str = response.content
+        return [e.strip() for e in entities_str.split(',') if e.strip()]
+
+    def extract_entities(self, query):
+        if ENTITY_EXTRACTION == "llm":
+            return self.llm_extract_entities(query)
+        if not self._entity_index_loaded:
+            # Concurrent first questions wait for one load rather than seeing an empty index
+            with self._entity_index_lock:
+                if not self._entity_index_loaded:
+                    self.refresh_entity_index()
+        entities = self.entity_index.match(query)
+        if not entities and (ENTITY_EXTRACTION == "local+llm" or len(self.entity_index) == 0):
+            # An empty index means the graph could not be loaded; don't silently lose graph context
+            return self.llm_extract_entities(query)
+        return entities
+
+    def _extract_entities_or_none(self, query):
+        try:
+            return self.extract_entities(query)
+        except Exception as e:
+            print(f"Entity extraction failed: {e}")
+            return []
+
+    def extract_entities_batch(self, queries):
+        """extract_entities for each question; LLM fallbacks run side by side, at most
+        BATCH_CONCURRENCY at a time, instead of one question after another."""
+        if len(queries) <= 1:
+            return [self._extract_entities_or_none(q) for q in queries]
+        # Each call gets its own copy of the caller's context, which carries the trace
+        contexts = [contextvars.copy_context() for _ in queries]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(queries), BATCH_CONCURRENCY),
+                                                   thread_name_prefix="entities") as pool:
+            return list(pool.map(lambda context, q: context.run(self._extract_entities_or_none, q),
+                                 contexts, queries))
+
+    def graph_search(self, query):
+        """Retrieves relevant graph triples based on entities in the query."""
+        return self.graph_search_batch([query])[0]
+
+    def graph_search_batch(self, queries):
+        """Graph triples for each question, in input order.
+
+        Answered in-process from the graph snapshot when there is one,
+        otherwise from a single Neo4j round-trip.
+        """
+        with span("graph_search.entities"):
+            entities = self.extract_entities_batch(queries)
+        add("graph_search.entities", sum(len(e) for e in entities))
+
+        snapshot = self.graph_snapshot
+        if snapshot is not None:
+            with span("graph_search.snapshot"):
+                results = [[f"{source} --[{rel_type}]--> {target}" for source, rel_type, target in
+                            snapshot.search(entities[i], relation_words(query), GRAPH_NODES_PER_ENTITY,
+                                            GRAPH_RESULT_LIMIT, GRAPH_HOPS)]
+                           for i, query in enumerate(queries)]
+            add("retrieved.triples", sum(len(t) for t in results))
+            return results
+
+        questions = []
+        for i, query in enumerate(queries):
+            terms = relation_terms(query)
+            if entities[i] or terms:
+                questions.append({"index": i, "entities": [lucene_phrase(e) for e in entities[i]],
+                                  "relation_terms": terms})
+        results = [[] for _ in queries]
+        if not questions:
+            return results
+
         try:
-            with self.neo4j_driver.session() as session:
-                for entity in entities:
-                    # Cypher query to find related nodes
-                    cypher = """
-                    MATCH (a:Entity)-[r:RELATED]->(b:Entity)
-                    WHERE a.name CONTAINS $entity OR b.name CONTAINS $entity
-                    RETURN a.name, r.type, b.name
-                    LIMIT 5
-                    """
-                    result = session.run(cypher, entity=entity)
-                    for record in result:
-                        triples.append(f"{record['a.name']} --[{record['r.type']}]--> {record['b.name']}")
+            with self.neo4j_driver.session() as session, span("graph_search.neo4j"):
+                try:
+                    records = list(session.run(
+                        GRAPH_SEARCH_CYPHER,
+                        questions=questions,
+                        nodes_per_entity=GRAPH_NODES_PER_ENTITY,
+                        limit=GRAPH_RESULT_LIMIT
+                    ))
+                except Exception as e:
+                    if not is_client_error(e):
+                        raise
+                    print(f"Full-text graph search unavailable ({e.code}); run setup_database.py.")
+                    fallback = [{"index": q["index"], "entities": entities[q["index"]]} for q in questions]
+                    records = list(session.run(
+                        GRAPH_SEARCH_FALLBACK_CYPHER, questions=fallback, limit=GRAPH_RESULT_LIMIT
+                    ))
+                for record in records:
+                    results[record["index"]].append(f"{record['source']} --[{record['type']}]--> {record['target']}")
         except Exception as e:
             print(f"Graph search failed: {e}")
-            
-        return list(set(triples))
 
-    def generate_response(self, query):
-        # 1. Retrieve Context
-        vector_docs = self.vector_search(query)
-        graph_data = self.graph_search(query)
-        
-        context_text = "\n\n".join(vector_docs)
-        context_graph = "\n".join(graph_data)
-        
-        full_context = f"### TEXT SOURCES:\n{context_text}\n\n### KNOWLEDGE GRAPH:\n{context_graph}"
-        
-        # 2. Prepare Prompt
-        system_prompt = """You are a helpful educational assistant for Class 6 English.
-        Answer the user's question using ONLY the provided context. 
-        If the answer is not in the context, say "I cannot find the answer in the textbook."
-        
-        Combine information from both the text sources and the knowledge graph to provide a complete answer.
+        # Keep the ranked order while dropping duplicates
+        results = [list(dict.fromkeys(triples)) for triples in results]
+        add("retrieved.triples", sum(len(t) for t in results))
+        return results
+
+    async def _run_branch(self, name, search, query, timeout):
+        """Runs one blocking retrieval branch in a thread, degrading to no results."""
+        try:
+            loop = asyncio.get_running_loop()
+            # copy_context carries the current trace into the worker thread
+            call = contextvars.copy_context().run
+            return await asyncio.wait_for(loop.run_in_executor(RETRIEVAL_EXECUTOR, call, search, query), timeout)
+        except asyncio.TimeoutError:
+            print(f"{name} timed out after {timeout}s; answering without it.")
+        except Exception as e:
+            print(f"{name} failed: {e}")
+        return []
+
+    def _start_retrieval(self, query):
+        """Starts the branches that don't need the question embedding (graph and lexical)."""
+        return asyncio.gather(
+            self._run_branch("Graph search", self.graph_search, query, GRAPH_SEARCH_TIMEOUT),
+            self._run_branch("Lexical search", self.lexical_search, query, VECTOR_SEARCH_TIMEOUT),
+        )
+
+    async def aretrieve(self, query, query_embedding=None, started=None):
+        """Runs vector, lexical and graph retrieval concurrently; returns (text_hits, graph_data).
+
+        Vector and lexical hits are merged by reciprocal rank fusion. Without a
+        query embedding, text comes from the lexical index alone. `started` is
+        the future from _start_retrieval if the other branches are already running.
         """
-        
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
+        started = started or self._start_retrieval(query)
+        vector_hits = []
+        if query_embedding is not None:
+            def search(q):
+                return self.vector_search(q, query_embedding=query_embedding)
+            vector_hits = await self._run_branch("Vector search", search, query, VECTOR_SEARCH_TIMEOUT)
+        graph_data, lexical_hits = await started
+        return fuse_hits(vector_hits, lexical_hits), graph_data
+
+    def build_context(self, vector_docs, graph_data, query=""):
+        """Fits the retrieved chunks and triples into CONTEXT_TOKEN_BUDGET (see context_builder)."""
+        with span("context.assemble"):
+            passages, triples = assemble_context(
+                vector_docs, graph_data, query,
+                token_budget=CONTEXT_TOKEN_BUDGET,
+                max_chunks=CONTEXT_MAX_CHUNKS,
+                lambda_mult=MMR_LAMBDA,
+                graph_share=CONTEXT_GRAPH_SHARE
+            )
+        context_text = "\n\n".join(passages)
+        context_graph = "\n".join(triples)
+        context = f"### TEXT SOURCES:\n{context_text}\n\n### KNOWLEDGE GRAPH:\n{context_graph}"
+        add("context.tokens", estimate_tokens(context))
+        return context
+
+    def answer_prompt(self):
+        # Imported on first use: langchain_core.prompts pulls in the tracing stack (~0.5 s)
+        from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+        return ChatPromptTemplate.from_messages([
+            ("system", SYSTEM_PROMPT),
             MessagesPlaceholder(variable_name="history"),
             ("user", "Context:\n{context}\n\nQuestion: {question}")
         ])
+
+    async def _aembed_query(self, query):
+        """Embeds the question for the answer cache and vector search (None if unavailable)."""
+        return await self._aembed("embed_query", query)
+
+    async def _aembed(self, method, text):
+        """Runs self.embeddings.<method>(text) in the retrieval pool; None when embedding is unavailable.
+
+        With a lexical index to fall back on, a failure or a call slower than
+        EMBEDDING_TIMEOUT also pauses embedding for EMBEDDING_RETRY_AFTER
+        seconds, so an outage doesn't cost every question the full timeout.
+        """
+        if time.monotonic() < self._embedding_retry_at:
+            add("embedding.skipped")
+            return None
+        fallback = self.lexical_index is not None and len(self.lexical_index) > 0
+        timeout = EMBEDDING_TIMEOUT if fallback else VECTOR_SEARCH_TIMEOUT
+        try:
+            embed = getattr(self.embeddings, method)
+            loop = asyncio.get_running_loop()
+            call = contextvars.copy_context().run
+            return await asyncio.wait_for(
+                loop.run_in_executor(RETRIEVAL_EXECUTOR, call, embed, text), timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"Question embedding timed out after {timeout}s.")
+        except Exception as e:
+            print(f"Question embedding failed: {e}")
+        if fallback:
+            print(f"Using the lexical index only for the next {EMBEDDING_RETRY_AFTER:.0f}s.")
+            self._embedding_retry_at = time.monotonic() + EMBEDDING_RETRY_AFTER
+        return None
+
+    async def _aprepare(self, query, session_id):
+        """Everything before the answer LLM call: answer cache lookup, then retrieval.
+
+        Returns a turn dict; turn["answer"] is set only on a cache hit.
+        """
+        trace = start_trace("query")
+        history = self.memory.load(session_id)
+        turn = {"query": query, "session_id": session_id, "history": history, "trace": trace,
+                "conversation": history_key(history), "embedding": None, "answer": None, "context": None}
+
+        version = await self._acorpus_version()
+
+        # Graph and lexical search don't need the embedding, so they start right away
+        started = self._start_retrieval(query)
+
+        # 0. Question embedding, shared by the answer cache and vector search
+        with trace.span("vector_search.embed_query"):
+            turn["embedding"] = await self._aembed_query(query)
+
+        # 1. Answer Cache (near-identical question, same history, same corpus)
+        with trace.span("answer_cache.lookup"):
+            self.answer_cache.set_corpus_version(version)
+            cached = None
+            if turn["embedding"] is not None:
+                cached = self.answer_cache.lookup(turn["embedding"], turn["conversation"])
+        if cached:
+            trace.add("answer_cache.hits")
+            turn["answer"], turn["context"] = cached
+            started.cancel()
+            await asyncio.gather(started, return_exceptions=True)
+            return turn
+
+        # 2. Retrieve Context (all branches at once, each bounded by its timeout)
+        text_hits, graph_data = await self.aretrieve(query, turn["embedding"], started)
+        turn["context"] = self.build_context(text_hits, graph_data, query)
+        return turn
+
+    def _answer_inputs(self, turn):
+        return {"history": turn["history"], "context": turn["context"], "question": turn["query"]}
+
+    def _finish(self, turn, answer):
+        """Updates memory, caches freshly generated answers and publishes the trace."""
+        # A summary of older turns (MEMORY_SUMMARY) is an LLM call; it runs in the background
+        # so it never blocks the event loop or holds up the end of a streamed answer
+        self.memory.save(turn["session_id"], turn["query"], answer, wait=False)
+        if turn["answer"] is None and turn["embedding"] is not None:
+            self.answer_cache.put(turn["embedding"], answer, turn["context"], turn["conversation"])
+        self._publish_trace(turn)
+
+    def _publish_trace(self, turn):
+        trace = turn["trace"]
+        trace.finish()
+        self.traces[turn["session_id"]] = trace
+        self.traces.move_to_end(turn["session_id"])
+        while len(self.traces) > 1000:
+            self.traces.popitem(last=False)
+
+    def last_trace(self, session_id="default"):
+        """The finished trace of the session's most recent question, if tracing is on."""
+        return self.traces.get(session_id)
+
+    async def agenerate_response(self, query, session_id="default"):
+        turn = await self._aprepare(query, session_id)
+        if turn["answer"] is not None:
+            self._finish(turn, turn["answer"])
+            return turn["answer"], turn["context"]
         
         # 3. Generate
-        history = self.memory.load_memory_variables({})["history"]
-        chain = prompt | self.llm
-        response = chain.invoke({
-            "history": history,
-            "context": full_context,
-            "question": query
-        })
+        chain = self.answer_prompt() | self.llm
+        with turn["trace"].span("answer.llm"):
+            response = await chain.ainvoke(self._answer_inputs(turn))
+        turn["trace"].add_usage(response)
         
-        # 4. Update Memory
-        self.memory.save_context({"input": query}, {"output": response.content})
+        # 4. Update Memory and Cache
+        self._finish(turn, response.content)
         
-        return response.content, full_context
+        return response.content, turn["context"]
+
+    def generate_response(self, query, session_id="default"):
+        return run_sync(self.agenerate_response(query, session_id))
+
+    def generate_response_stream(self, query, session_id="default"):
+        """Yields answer tokens as the chat model produces them.
+
+        The generator's return value (StopIteration.value, or the result of
+        `yield from`) is the retrieval context. Memory is updated once the
+        answer is complete; an abandoned stream (e.g. a Streamlit stop or
+        rerun) only publishes its trace.
+        """
+        turn = run_sync(self._aprepare(query, session_id))
+        answer = None
+        try:
+            if turn["answer"] is not None:
+                yield turn["answer"]
+                answer = turn["answer"]
+            else:
+                trace = turn["trace"]
+                chain = self.answer_prompt() | self.llm
+                parts = []
+                with trace.span("answer.llm"):
+                    start = time.perf_counter()
+                    for chunk in chain.stream(self._answer_inputs(turn)):
+                        trace.add_usage(chunk)
+                        if chunk.content:
+                            if not parts:
+                                trace.record("answer.first_token", time.perf_counter() - start)
+                            parts.append(chunk.content)
+                            yield chunk.content
+                answer = "".join(parts)
+        finally:
+            if answer is not None:
+                self._finish(turn, answer)
+            else:
+                self._publish_trace(turn)
+        return turn["context"]
+
+    async def agenerate_response_stream(self, query, session_id="default", on_context=None):
+        """Async generator of answer tokens, for servers running on an event loop.
+
+        An async generator can't return a value, so the retrieval context is
+        passed to `on_context` (if given) before the first token instead.
+        """
+        turn = await self._aprepare(query, session_id)
+        if on_context is not None:
+            on_context(turn["context"])
+        answer = None
+        try:
+            if turn["answer"] is not None:
+                yield turn["answer"]
+                answer = turn["answer"]
+            else:
+                trace = turn["trace"]
+                chain = self.answer_prompt() | self.llm
+                parts = []
+                with trace.span("answer.llm"):
+                    start = time.perf_counter()
+                    async for chunk in chain.astream(self._answer_inputs(turn)):
+                        trace.add_usage(chunk)
+                        if chunk.content:
+                            if not parts:
+                                trace.record("answer.first_token", time.perf_counter() - start)
+                            parts.append(chunk.content)
+                            yield chunk.content
+                answer = "".join(parts)
+        finally:
+            if answer is not None:
+                self._finish(turn, answer)
+            else:
+                self._publish_trace(turn)
+
+    async def agenerate_batch(self, questions, max_concurrency=BATCH_CONCURRENCY):
+        """Answers a list of independent questions (e.g. a worksheet) with few round-trips.
+
+        All questions are embedded in one call, searched with one vector query
+        and one graph query, and answered with at most `max_concurrency` LLM
+        calls in flight. Session memory is not used. Returns one dict per
+        question, in input order: {"question", "answer", "context", "error"},
+        where error is None or the message of what failed for that question.
+        """
+        trace = start_trace("batch")
+        results = [{"question": q, "answer": None, "context": None, "error": None} for q in questions]
+        if not questions:
+            trace.finish()
+            return results
+        add("batch.questions", len(questions))
+
+        version = await self._acorpus_version()
+        self.answer_cache.set_corpus_version(version)
+
+        # 1. One embedding call for every question (None: lexical retrieval only)
+        with trace.span("batch.embed"):
+            embeddings = await self._aembed("embed_documents", list(questions))
+
+        pending = []
+        for i, question in enumerate(questions):
+            cached = self.answer_cache.lookup(embeddings[i]) if embeddings else None
+            if cached:
+                trace.add("answer_cache.hits")
+                results[i]["answer"], results[i]["context"] = cached
+            else:
+                pending.append(i)
+        if not pending:
+            trace.finish()
+            return results
+
+        # 2. One vector query, one graph query and the local lexical index, concurrently
+        texts = [questions[i] for i in pending]
+        branches = [
+            # Entity extraction may fall back to the LLM, BATCH_CONCURRENCY questions at a time
+            self._run_branch("Graph search", self.graph_search_batch, texts,
+                             GRAPH_SEARCH_TIMEOUT * math.ceil(len(texts) / max(1, BATCH_CONCURRENCY))),
+            self._run_branch("Lexical search", lambda qs: [self.lexical_search(q) for q in qs], texts,
+                             VECTOR_SEARCH_TIMEOUT),
+        ]
+        if embeddings:
+            branches.append(self._run_branch("Vector search", self.vector_search_batch,
+                                             [embeddings[i] for i in pending], VECTOR_SEARCH_TIMEOUT))
+        graph_data, lexical_hits, *vector = await asyncio.gather(*branches)
+        vector_hits = vector[0] if vector else []
+
+        for n, i in enumerate(pending):
+            try:
+                text_hits = fuse_hits(vector_hits[n] if vector_hits else [], lexical_hits[n] if lexical_hits else [])
+                triples = graph_data[n] if graph_data else []
+                results[i]["context"] = self.build_context(text_hits, triples, questions[i])
+            except Exception as e:
+                results[i]["error"] = f"Retrieval failed: {e}"
+
+        # 3. Answers, with a bounded number of LLM calls in flight
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def answer(i):
+            async with semaphore:
+                try:
+                    chain = self.answer_prompt() | self.llm
+                    with trace.span("answer.llm"):
+                        response = await chain.ainvoke(
+                            {"history": [], "context": results[i]["context"], "question": questions[i]}
+                        )
+                    trace.add_usage(response)
+                    results[i]["answer"] = response.content
+                    if embeddings:
+                        self.answer_cache.put(embeddings[i], response.content, results[i]["context"])
+                except Exception as e:
+                    results[i]["error"] = f"Answer generation failed: {e}"
+
+        await asyncio.gather(*(answer(i) for i in pending if results[i]["error"] is None))
+        trace.finish()
+        return results
+
+    def generate_batch(self, questions, max_concurrency=BATCH_CONCURRENCY):
+        return run_sync(self.agenerate_batch(questions, max_concurrency))
 
 if __name__ == "__main__":
     bot = RAGBot()
+    status = bot.warmup()
+    for name, check in status["checks"].items():
+        print(f"  {name:<15}{'ok' if check['ok'] else 'FAILED':<8}{check['detail']}")
     print("RAG Bot initialized (Chroma + Neo4j). Type 'exit' to quit.")
     while True:
         q = input("\nYou: ")
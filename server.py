@@ -0,0 +1,272 @@
+"""Asynchronous HTTP service for RAGBot (aiohttp), for load balancers and the LMS.
+
+Endpoints:
+  POST /ask         {"question": ..., "session_id": optional} -> {"answer", "context", "shared"}
+  POST /ask/stream  same body; the answer as server-sent events: "token" events, then "done" or "error"
+  GET  /health      RAGBot.health() plus the service's queue; 503 when questions can't be answered
+  GET  /metrics     pipeline metrics in Prometheus text format
+
+At most SERVER_MAX_CONCURRENCY questions are answered at once and up to
+SERVER_MAX_QUEUE more wait for a slot; beyond that requests get 503 with
+Retry-After, so the load balancer can send them elsewhere. A question asked
+while an identical one (same words, same conversation history) is already
+being answered joins that run instead of starting another ("shared": true).
+Requests without a session_id have no conversation memory.
+
+Run with `python server.py --port 8080`.
+"""
+import asyncio
+import json
+import os
+import uuid
+
+from aiohttp import web
+
+from answer_cache import history_key
+from rag_bot import RETRIEVAL_WORKERS, RAGBot
+from tracing import METRICS
+
+# Questions answered at once, and questions allowed to wait for a slot before requests are refused
+SERVER_MAX_CONCURRENCY = int(os.getenv("SERVER_MAX_CONCURRENCY", "16"))
+SERVER_MAX_QUEUE = int(os.getenv("SERVER_MAX_QUEUE", "64"))
+# Longest question accepted, in characters
+SERVER_MAX_QUESTION_CHARS = int(os.getenv("SERVER_MAX_QUESTION_CHARS", "2000"))
+
+BOT = web.AppKey("bot", RAGBot)
+
+
+def _json_error(error_class, message, **kwargs):
+    return error_class(text=json.dumps({"error": message}), content_type="application/json", **kwargs)
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+class Flight:
+    """One run of the answer pipeline, shared by every request for the same question.
+
+    Tokens are kept as they arrive, so a request that joins late (or reads
+    slowly) replays them from the start without holding up the run.
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.tokens = []
+        self.context = None
+        self.error = None
+        self.done = False
+        self.task = None
+        self._updated = asyncio.Event()
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def set_context(self, context):
+        self.context = context
+
+    def publish(self, token):
+        self.tokens.append(token)
+        self._notify()
+
+    def finish(self, error=None):
+        self.error = error
+        self.done = True
+        self._notify()
+
+    async def stream(self):
+        """Yields every token of the answer; raises the run's error if it failed."""
+        sent = 0
+        while True:
+            updated = self._updated
+            while sent < len(self.tokens):
+                yield self.tokens[sent]
+                sent += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await updated.wait()
+
+
+class QueryService:
+    """Coalesces identical questions and bounds how many runs are in progress."""
+
+    def __init__(self, bot, max_concurrency=SERVER_MAX_CONCURRENCY, max_queue=SERVER_MAX_QUEUE):
+        self.bot = bot
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.flights = {}
+        self.running = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    def join(self, question, session_id=None):
+        """Returns (flight, shared): the run answering this question, starting one if needed.
+
+        Raises 503 when SERVER_MAX_QUEUE runs are already waiting for a slot.
+        """
+        METRICS.increment("server.requests")
+        history = self.bot.memory.load(session_id) if session_id else []
+        key = (" ".join(question.split()).casefold(), history_key(history))
+        flight = self.flights.get(key)
+        if flight is not None:
+            METRICS.increment("server.coalesced")
+            return flight, True
+        if self.running + self.waiting >= self.max_concurrency + self.max_queue:
+            METRICS.increment("server.rejected")
+            raise _json_error(web.HTTPServiceUnavailable, "Too many questions in progress; retry shortly.",
+                              headers={"Retry-After": "1"})
+
+        # Without a session the run gets a throwaway one, cleared when it ends
+        flight = Flight(session_id or f"server-{uuid.uuid4().hex}")
+        self.flights[key] = flight
+        self.waiting += 1
+        flight.task = asyncio.create_task(self._run(key, flight, question, own_session=session_id is None))
+        return flight, False
+
+    async def _run(self, key, flight, question, own_session):
+        try:
+            try:
+                await self._slots.acquire()
+            finally:
+                self.waiting -= 1
+            self.running += 1
+            try:
+                async for token in self.bot.agenerate_response_stream(question, flight.session_id,
+                                                                      on_context=flight.set_context):
+                    flight.publish(token)
+            finally:
+                self.running -= 1
+                self._slots.release()
+            flight.finish()
+        except Exception as e:
+            print(f"Answering failed: {e}")
+            flight.finish(e)
+        finally:
+            if not flight.done:
+                flight.finish(RuntimeError("The server is shutting down."))
+            # Later arrivals start a fresh run (and see the answer cache and memory it updated)
+            self.flights.pop(key, None)
+            if own_session:
+                self.bot.memory.clear(flight.session_id)
+
+    def remember(self, flight, question, session_id, answer):
+        """Saves a shared answer to the memory of a session that didn't run it."""
+        if session_id and session_id != flight.session_id:
+            self.bot.memory.save(session_id, question, answer)
+
+    def status(self):
+        return {"running": self.running, "waiting": self.waiting,
+                "max_concurrency": self.max_concurrency, "max_queue": self.max_queue}
+
+    async def close(self):
+        tasks = [f.task for f in self.flights.values() if f.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+SERVICE = web.AppKey("service", QueryService)
+
+
+async def _read_question(request):
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise _json_error(web.HTTPBadRequest, "Body must be JSON.")
+    question = body.get("question") if isinstance(body, dict) else None
+    if not isinstance(question, str) or not question.strip():
+        raise _json_error(web.HTTPBadRequest, 'Expected {"question": "..."}.')
+    if len(question) > SERVER_MAX_QUESTION_CHARS:
+        raise _json_error(web.HTTPBadRequest, f"Questions are limited to {SERVER_MAX_QUESTION_CHARS} characters.")
+    session_id = body.get("session_id")
+    return question.strip(), str(session_id) if session_id else None
+
+
+async def ask(request):
+    service = request.app[SERVICE]
+    question, session_id = await _read_question(request)
+    flight, shared = service.join(question, session_id)
+    try:
+        answer = "".join([token async for token in flight.stream()])
+    except Exception as e:
+        raise _json_error(web.HTTPBadGateway, f"Answering failed: {e}")
+    service.remember(flight, question, session_id, answer)
+    return web.json_response({"answer": answer, "context": flight.context, "shared": shared})
+
+
+async def ask_stream(request):
+    service = request.app[SERVICE]
+    question, session_id = await _read_question(request)
+    flight, shared = service.join(question, session_id)
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    parts = []
+    try:
+        # write() waits while the client's socket is full, so a slow reader only slows itself
+        async for token in flight.stream():
+            parts.append(token)
+            await response.write(_event("token", {"text": token}))
+        service.remember(flight, question, session_id, "".join(parts))
+        await response.write(_event("done", {"context": flight.context, "shared": shared}))
+    except ConnectionResetError:
+        # The client left; the run carries on for anyone else waiting on it
+        return response
+    except Exception as e:
+        await response.write(_event("error", {"error": f"Answering failed: {e}"}))
+    await response.write_eof()
+    return response
+
+
+async def health(request):
+    service = request.app[SERVICE]
+    report = await asyncio.get_running_loop().run_in_executor(None, service.bot.health)
+    report["service"] = service.status()
+    return web.json_response(report, status=200 if report["ok"] else 503)
+
+
+async def metrics(request):
+    return web.Response(text=METRICS.to_prometheus(), content_type="text/plain")
+
+
+def create_app(bot=None, max_concurrency=SERVER_MAX_CONCURRENCY, max_queue=SERVER_MAX_QUEUE, warmup=False):
+    """Builds the aiohttp application around `bot` (a new RAGBot by default)."""
+    app = web.Application()
+    app[BOT] = bot if bot is not None else RAGBot()
+
+    async def start(app):
+        app[SERVICE] = QueryService(app[BOT], max_concurrency, max_queue)
+        if RETRIEVAL_WORKERS < 3 * max_concurrency:
+            # Branches queued for a retrieval thread time out and drop their context
+            print(f"Warning: RETRIEVAL_WORKERS={RETRIEVAL_WORKERS} is below 3 x SERVER_MAX_CONCURRENCY "
+                  f"({3 * max_concurrency}); retrieval will time out under load.")
+        if warmup:
+            # Open every backend connection now, in parallel, rather than on the first question
+            status = await asyncio.get_running_loop().run_in_executor(None, app[BOT].warmup)
+            for name, check in status["checks"].items():
+                if not check["ok"]:
+                    print(f"Warm-up: {name} unavailable ({check['detail']})")
+
+    async def stop(app):
+        await app[SERVICE].close()
+
+    app.on_startup.append(start)
+    app.on_cleanup.append(stop)
+    app.router.add_post("/ask", ask)
+    app.router.add_post("/ask/stream", ask_stream)
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics)
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Serve RAGBot over HTTP.")
+    arg_parser.add_argument("--host", default=os.getenv("SERVER_HOST", "0.0.0.0"))
+    arg_parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8080")))
+    args = arg_parser.parse_args()
+    web.run_app(create_app(warmup=True), host=args.host, port=args.port)
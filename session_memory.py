@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from graph_extraction import estimate_tokens
+
+
+class SessionMemoryStore:
+    """Conversation memory kept separately per session, within a token budget.
+
+    Each session holds a sliding window of the most recent messages that fits
+    in `max_tokens`. Messages that fall out of the window are either dropped
+    or, if a `summarizer(previous_summary, messages) -> str` is given, folded
+    into a running summary (itself capped at `max_summary_tokens`). Sessions
+    idle for more than `idle_ttl` seconds are evicted, as are the least
+    recently used ones beyond `max_sessions`.
+    """
+
+    def __init__(self, max_tokens=1500, summarizer=None, max_summary_tokens=300,
+                 idle_ttl=3600, max_sessions=1000):
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.max_summary_tokens = max_summary_tokens
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session_id -> session, least recently used first
+        self._lock = threading.Lock()
+        # One thread, so background summaries of a session are applied in order
+        self._summaries = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summary")
+
+    def _evict_idle(self, now):
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session["last_used"] <= self.idle_ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+
+    def _session(self, session_id):
+        now = time.time()
+        self._evict_idle(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = {"messages": [], "summary": "", "last_used": now}
+            self._sessions[session_id] = session
+        session["last_used"] = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def load(self, session_id):
+        """Returns the session's history as chat messages, summary first."""
+        with self._lock:
+            session = self._session(session_id)
+            history = list(session["messages"])
+            if session["summary"]:
+                history.insert(0, SystemMessage(content=f"Summary of the earlier conversation: {session['summary']}"))
+            return history
+
+    def save(self, session_id, question, answer, wait=True):
+        """Adds an exchange to the session.
+
+        With wait=False, folding overflow into the summary (usually an LLM
+        call) happens on a background thread, so callers on an event loop or
+        streaming an answer don't wait for it. The window itself is updated
+        before save() returns either way.
+        """
+        with self._lock:
+            session = self._session(session_id)
+            session["messages"].extend([HumanMessage(content=question), AIMessage(content=answer)])
+
+            # Slide the window: drop whole exchanges from the front until it fits
+            messages = session["messages"]
+            overflow = []
+            while len(messages) > 2 and sum(estimate_tokens(m.content) for m in messages) > self.max_tokens:
+                overflow.extend(messages[:2])
+                del messages[:2]
+
+        if overflow and self.summarizer:
+            if wait:
+                self._summarize(session_id, overflow)
+            else:
+                self._summaries.submit(self._summarize, session_id, overflow)
+
+    def _summarize(self, session_id, overflow):
+        # Summarize outside the lock; it is usually an LLM call
+        with self._lock:
+            session = self._sessions.get(session_id)
+            summary = session["summary"] if session else ""
+        try:
+            summary = self.summarizer(summary, overflow)
+        except Exception as e:
+            print(f"Conversation summary failed: {e}")
+            return
+        summary = summary[:self.max_summary_tokens * 4]
+        with self._lock:
+            if session_id in self._sessions:
+                self._sessions[session_id]["summary"] = summary
+
+    def flush(self):
+        """Waits for background summaries queued by save(..., wait=False)."""
+        self._summaries.submit(lambda: None).result()
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
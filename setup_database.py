@@ -1,6 +1,5 @@
 import os
 from dotenv import load_dotenv
-from neo4j import GraphDatabase
 
 load_dotenv()
 
@@ -8,11 +7,18 @@ NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USERNAME = os.getenv("NEO4J_USERNAME")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 
+# Full-text indexes used by RAGBot.graph_search (a plain index can't serve CONTAINS/fuzzy lookups)
+ENTITY_FULLTEXT_INDEX = "entity_names"
+RELATION_FULLTEXT_INDEX = "relation_types"
+
 def setup_database():
     if not all([NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD]):
         print("Error: Neo4j credentials missing in .env")
         return
 
+    # Imported here so rag_bot can read the index names without loading the driver
+    from neo4j import GraphDatabase
+
     try:
         driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD))
         
@@ -34,6 +40,20 @@ def setup_database():
             except Exception as e:
                 print(f"Index creation note: {e}")
 
+            # Full-text indexes: ranked lookups by entity name and relationship type
+            try:
+                session.run(
+                    f"CREATE FULLTEXT INDEX {ENTITY_FULLTEXT_INDEX} IF NOT EXISTS "
+                    "FOR (n:Entity) ON EACH [n.name]"
+                )
+                session.run(
+                    f"CREATE FULLTEXT INDEX {RELATION_FULLTEXT_INDEX} IF NOT EXISTS "
+                    "FOR ()-[r:RELATED]-() ON EACH [r.type]"
+                )
+                print("Created full-text indexes on Entity.name and RELATED.type")
+            except Exception as e:
+                print(f"Full-text index creation note: {e}")
+
         driver.close()
         print("Database setup complete.")
 
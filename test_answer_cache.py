@@ -0,0 +1,41 @@
+import time
+
+from answer_cache import SemanticAnswerCache, history_key
+from fakes import FakeEmbeddings
+
+embed = FakeEmbeddings(size=256).embed_query
+
+
+def test_similar_question_hits_and_different_question_misses():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.put(embed("what is the moral of the turtle story"), "Slow and steady.", "ctx")
+    assert cache.lookup(embed("What is the moral of the turtle story?")) == ("Slow and steady.", "ctx")
+    assert cache.lookup(embed("who wrote the poem about rain")) is None
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_history_ttl_and_corpus_version_are_respected():
+    cache = SemanticAnswerCache(threshold=0.9, ttl=0.05)
+    cache.set_corpus_version("v1")
+    question = embed("moral of the turtle story")
+    cache.put(question, "answer", "ctx", history_key(["earlier turn"]))
+    assert cache.lookup(question) is None
+    assert cache.lookup(question, history_key(["earlier turn"])) is not None
+
+    cache.set_corpus_version("v2")
+    assert cache.lookup(question, history_key(["earlier turn"])) is None
+
+    cache.put(question, "answer", "ctx")
+    time.sleep(0.06)
+    assert cache.lookup(question) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(threshold=0.99, max_entries=2)
+    a, b, c = embed("alpha apple"), embed("beta banana"), embed("gamma grape")
+    cache.put(a, "A", "")
+    cache.put(b, "B", "")
+    cache.lookup(a)
+    cache.put(c, "C", "")
+    assert cache.lookup(b) is None
+    assert cache.lookup(a) == ("A", "")
@@ -0,0 +1,65 @@
+from answer_cache import SemanticAnswerCache
+from benchmark import synthetic_pages
+from fakes import FakeChatModel, FakeEmbeddings, FakeNeo4jDriver, default_responder
+from ingest_data import ingest_documents
+from vector_store import LocalVectorStore
+
+QUESTIONS = [
+    "What did Ravi find near the river?",
+    "Why was Meena worried about Kumar?",
+    "Who won the race, the Turtle or the Hare?",
+    "What did Tenali say to Raman?",
+]
+
+
+def responder(prompt):
+    if "Question: What did Tenali" in prompt:
+        raise RuntimeError("model overloaded")
+    return default_responder(prompt)
+
+
+def test_batch_answers_in_order_with_few_round_trips(tmp_path, make_bot):
+    collection = LocalVectorStore(str(tmp_path / "store"))
+    driver = FakeNeo4jDriver()
+    embeddings = FakeEmbeddings()
+    ingest_documents(synthetic_pages(5), "synthetic.pdf", embeddings_model=embeddings, collection=collection,
+                     llm=FakeChatModel(), driver=driver, manifest_path=str(tmp_path / "manifest.json"))
+
+    bot = make_bot(collection=collection, neo4j_driver=driver, llm=FakeChatModel(responder=responder))
+    bot.answer_cache = SemanticAnswerCache(max_entries=0)
+    bot.graph_snapshot = None  # count the batched Neo4j query, not in-process lookups
+    bot.refresh_entity_index()
+    queries = []
+    query = collection.query
+    collection.query = lambda **kwargs: queries.append(kwargs) or query(**kwargs)
+    graph_queries = driver.queries
+
+    results = bot.generate_batch(QUESTIONS, max_concurrency=2)
+
+    assert [r["question"] for r in results] == QUESTIONS
+    assert bot.embeddings.calls == 1
+    assert len(queries) == 1 and len(queries[0]["query_embeddings"]) == len(QUESTIONS)
+    assert driver.queries - graph_queries == 1
+    for result in results[:3]:
+        assert result["error"] is None and result["answer"].startswith("Answer based on")
+        assert "### TEXT SOURCES:" in result["context"]
+    assert results[3]["answer"] is None and "model overloaded" in results[3]["error"]
+    assert bot.generate_batch([]) == []
+
+
+def test_llm_entity_fallback_keeps_graph_context_for_a_large_batch(make_bot, monkeypatch):
+    import rag_bot
+    from graph_snapshot import GraphSnapshot
+    monkeypatch.setattr(rag_bot, "ENTITY_EXTRACTION", "local+llm")
+    monkeypatch.setattr(rag_bot, "GRAPH_SEARCH_TIMEOUT", 2.0)
+    bot = make_bot(llm=FakeChatModel(latency=0.4))
+    bot.answer_cache = SemanticAnswerCache(max_entries=0)
+    bot.graph_snapshot = GraphSnapshot.from_triples([("Ravi", "FOUND", "Bird")])
+    # Half the questions match no entity locally, so each needs an LLM extraction call
+    questions = [f"What did Ravi find on day {n}?" for n in range(8)] + \
+                [f"Where is the village of Chennai number {n}?" for n in range(8)]
+
+    results = bot.generate_batch(questions)
+
+    for result in results[:8]:
+        assert "Ravi --[FOUND]--> Bird" in result["context"]
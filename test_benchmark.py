@@ -0,0 +1,24 @@
+import json
+
+from benchmark import parse_args, percentile, run_benchmark
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 95) == 0.0
+
+
+def test_benchmark_reports_stages_and_throughput(tmp_path):
+    args = parse_args(["--pages", "3", "--rounds", "1", "--concurrency", "1", "2",
+                       "--embed-latency", "0", "--llm-latency", "0.01", "--graph-latency", "0",
+                       "--output", str(tmp_path / "bench.json")])
+    results = run_benchmark(args)
+
+    assert results["corpus"]["chunks"] > 0
+    assert {"embed", "store_write", "graph_write", "total"} <= set(results["ingest"])
+    assert {"vector_search", "graph_search", "retrieval", "total"} <= set(results["query"])
+    assert [row["concurrency"] for row in results["throughput"]] == [1, 2]
+    assert all(row["qps"] > 0 for row in results["throughput"])
+    json.dumps(results)
@@ -0,0 +1,45 @@
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from context_builder import assemble_context, merge_overlapping, mmr, rank_triples
+
+
+def test_mmr_skips_near_duplicates():
+    embeddings = [[1.0, 0.0], [0.99, 0.01], [0.6, 0.8]]
+    relevance = [0.95, 0.94, 0.7]
+    assert mmr(relevance, embeddings, 2, lambda_mult=0.5) == [0, 2]
+    assert mmr(relevance, embeddings, 2, lambda_mult=1.0) == [0, 1]
+    assert mmr([], [], 3) == []
+
+
+def test_adjacent_splitter_chunks_merge_back_into_one_passage():
+    text = " ".join(f"Sentence {n} tells how Ravi helped Meena carry water to the village." for n in range(40))
+    chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_text(text)
+    assert len(chunks) >= 3
+
+    merged = merge_overlapping([chunks[1], chunks[0], "An unrelated passage.", chunks[2]])
+    assert len(merged) == 2
+    assert merged[0] == " ".join(text.split()[:len(merged[0].split())])
+    assert merged[1] == "An unrelated passage."
+    assert merge_overlapping([chunks[0], chunks[0][:300]]) == [chunks[0]]
+
+
+def test_triples_mentioning_the_question_rank_first():
+    triples = ["Hare --[RACED]--> Turtle", "Ravi --[FOUND]--> Bird", "Meena --[KNOWS]--> Ravi"]
+    assert rank_triples(triples, "What did Ravi find?")[:2] == ["Ravi --[FOUND]--> Bird", "Meena --[KNOWS]--> Ravi"]
+
+
+def test_context_fits_the_token_budget():
+    candidates = [{"text": f"Passage {n} " + "word " * 200, "relevance": 1.0 - n / 10, "embedding": [1.0, n]}
+                  for n in range(6)]
+    triples = [f"Entity{n} --[RELATED]--> Other{n}" for n in range(50)]
+
+    passages, kept = assemble_context(candidates, triples, "question", token_budget=700,
+                                      max_chunks=4, graph_share=0.2)
+    used = sum(len(p) // 4 for p in passages) + sum(len(t) // 4 for t in kept)
+    assert used <= 700
+    assert len(passages) == 2 and passages[0].startswith("Passage 0")
+    assert 0 < len(kept) < len(triples)
+
+    # Plain strings still work (no embeddings: relevance order)
+    passages, _ = assemble_context(["first", "second"], [], "q")
+    assert passages == ["first", "second"]
@@ -0,0 +1,59 @@
+from embedding_cache import CachedEmbeddings
+from fakes import FakeEmbeddings
+
+
+def test_repeat_queries_skip_the_model_and_survive_restarts(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    model = FakeEmbeddings()
+    cache = CachedEmbeddings(model, path=path)
+    seen = []
+    embed_query = model.embed_query
+    model.embed_query = lambda text: seen.append(text) or embed_query(text)
+
+    first = cache.embed_query("What is the moral of the turtle story?")
+    again = cache.embed_query("what is the moral of the  turtle story?")
+    assert model.calls == 1
+    assert again == first
+    # Only the cache key is case-folded; the model sees the question as asked
+    assert seen == ["What is the moral of the turtle story?"]
+    assert cache.stats()["hits"] == 1
+    cache.close()
+
+    reopened = CachedEmbeddings(model, path=path)
+    reopened.embed_query("What is the moral of the turtle story?")
+    assert model.calls == 1
+    assert reopened.stats()["disk_hits"] == 1
+
+
+def test_documents_only_embed_uncached_texts_once(tmp_path):
+    model = FakeEmbeddings()
+    cache = CachedEmbeddings(model, path=str(tmp_path / "cache.sqlite"))
+    cache.embed_documents(["a", "b"])
+    vectors = cache.embed_documents(["b", "c", "c"])
+    assert model.texts_embedded == 3
+    assert vectors[1] == vectors[2]
+
+
+def test_disk_store_evicts_least_recently_used_across_processes(tmp_path, monkeypatch):
+    import embedding_cache
+    monkeypatch.setattr(embedding_cache, "TOUCH_BATCH_SIZE", 1)
+    path = str(tmp_path / "cache.sqlite")
+    model = FakeEmbeddings(size=16)
+    # Each vector is 64 bytes on disk; room for four, evicting down to two
+    cache = CachedEmbeddings(model, path=path, max_disk_bytes=256, evict_to=0.5)
+    for text in ["one", "two", "three", "four"]:
+        cache.embed_documents([text])
+    # A hit served from memory still counts as a use on disk
+    cache.embed_documents(["one"])
+    assert model.calls == 4
+
+    # Another process sharing the file (e.g. ingestion) fills the cache past its limit
+    other = CachedEmbeddings(model, path=path, max_disk_bytes=256, evict_to=0.5)
+    other.embed_documents(["five"])
+    kept = {key for (key,) in other._db.execute("SELECT key FROM embeddings")}
+    assert kept == {other._key("one"), other._key("five")}
+    assert cache.disk_size() == other.disk_size() == 128
+
+    plan = " ".join(str(row) for row in cache._db.execute(
+        "EXPLAIN QUERY PLAN SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"))
+    assert "embeddings_last_used" in plan and "TEMP B-TREE" not in plan
@@ -0,0 +1,35 @@
+from entity_index import EntityIndex, normalize_tokens
+
+NAMES = ["Ravi", "Rip Van Winkle", "Rip", "Turtle", "The Hare", "Kaveri River", "the"]
+
+
+def test_matches_longest_multi_word_name():
+    index = EntityIndex(NAMES)
+    assert index.match("What did Rip Van Winkle see?") == ["Rip Van Winkle"]
+    assert index.match("Why did rip sleep?") == ["Rip"]
+
+
+def test_normalizes_case_and_plurals_and_skips_stopwords():
+    index = EntityIndex(NAMES)
+    assert len(index) == 6
+    assert index.match("Tell me about the turtles and the hare") == ["Turtle", "The Hare"]
+
+
+def test_stopwords_keep_their_final_s():
+    from lexical_index import tokenize
+    from rag_bot import relation_words
+    assert normalize_tokens("What does this story say") == ["what", "does", "this", "story", "say"]
+    assert relation_words("What does this story tell us about Ravi") == ["ravi"]
+    assert tokenize("Does this bird sing songs?") == ["bird", "sing", "song"]
+
+
+def test_tolerates_one_typo_in_long_names():
+    index = EntityIndex(NAMES + ["Meenakshi"])
+    assert index.match("Who is Meenaksi?") == ["Meenakshi"]
+    assert index.match("Who is Raavi?") == []
+
+
+def test_rebuild_replaces_entities():
+    index = EntityIndex(NAMES)
+    index.build(["Kumar"])
+    assert index.match("Ravi and Kumar") == ["Kumar"]
@@ -0,0 +1,49 @@
+import time
+
+from fakes import FakeChatModel, default_responder
+from graph_extraction import RateLimiter, extract_graphs
+from ingest_data import build_graph_chain
+
+TEXTS = [f"Chapter {i}: Ravi met Meena near the River Kaveri." for i in range(16)]
+
+
+def test_concurrent_extraction_is_faster_than_serial():
+    chain, parser = build_graph_chain(FakeChatModel(latency=0.05))
+    start = time.perf_counter()
+    results, errors = extract_graphs(chain, TEXTS, format_instructions=parser.get_format_instructions(),
+                                     max_workers=8)
+    elapsed = time.perf_counter() - start
+
+    assert not errors
+    assert all(r["nodes"] for r in results)
+    assert elapsed < 0.05 * len(TEXTS) / 2
+
+
+def test_failed_chunk_is_isolated_and_retried():
+    attempts = {"flaky": 0}
+
+    def responder(prompt):
+        if "BROKEN" in prompt:
+            raise RuntimeError("bad chunk")
+        if "FLAKY" in prompt and attempts["flaky"] < 2:
+            attempts["flaky"] += 1
+            raise RuntimeError("rate limited")
+        return default_responder(prompt)
+
+    chain, _ = build_graph_chain(FakeChatModel(responder=responder))
+    texts = ["Ravi sang.", "BROKEN Meena", "FLAKY Kaveri"]
+    results, errors = extract_graphs(chain, texts, max_retries=2, backoff=0.001)
+
+    assert list(errors) == [1]
+    assert results[1] is None
+    assert results[0] is not None and results[2] is not None
+    assert attempts["flaky"] == 2
+
+
+def test_rate_limiter_throttles_requests():
+    limiter = RateLimiter(requests_per_minute=600)  # 10 per second, burst of 600
+    limiter._request_allowance = 0
+    start = time.perf_counter()
+    for _ in range(3):
+        limiter.acquire()
+    assert time.perf_counter() - start >= 0.25
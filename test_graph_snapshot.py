@@ -0,0 +1,57 @@
+from fakes import FakeNeo4jDriver
+from graph_snapshot import GraphSnapshot, export_graph_snapshot
+from ingest_manifest import write_corpus_version
+
+TRIPLES = [
+    ("Ravi", "FOUND", "Bird"),
+    ("Bird", "LIVES_NEAR", "River"),
+    ("River", "FLOWS_TO", "Village"),
+    ("Meena", "FRIEND_OF", "Ravi"),
+    ("Hare", "RACED", "Turtle"),
+]
+
+
+def test_neighbourhoods_are_ranked_by_hops(tmp_path):
+    snapshot = GraphSnapshot.from_triples(TRIPLES, names=["Lonely Island"])
+    assert len(snapshot) == 5 and len(snapshot.names) == 8
+    assert list(snapshot.offsets[-1:]) == [10]
+
+    assert snapshot.search(["ravi"]) == [("Ravi", "FOUND", "Bird"), ("Meena", "FRIEND_OF", "Ravi")]
+    two_hops = snapshot.search(["Ravi"], hops=2)
+    assert two_hops[:2] == [("Ravi", "FOUND", "Bird"), ("Meena", "FRIEND_OF", "Ravi")]
+    assert two_hops[2:] == [("Bird", "LIVES_NEAR", "River")]
+    assert snapshot.search(["Lonely Island"], hops=2) == []
+    assert snapshot.search(["Island"]) == []
+    assert snapshot.search([], words=["race"]) == [("Hare", "RACED", "Turtle")]
+    assert snapshot.search(["Ravi"], limit=1) == [("Ravi", "FOUND", "Bird")]
+
+    snapshot.save(str(tmp_path / "graph"))
+    reloaded = GraphSnapshot.load(str(tmp_path / "graph"))
+    assert reloaded.names == snapshot.names
+    assert reloaded.search(["Ravi"], hops=2) == two_hops
+    assert GraphSnapshot.load(str(tmp_path / "missing")) is None
+
+
+def test_bot_answers_from_the_snapshot_and_reloads_on_a_new_corpus_version(make_bot):
+    driver = FakeNeo4jDriver()
+    for source, rel_type, target in TRIPLES[:2]:
+        driver.edges[(source, rel_type, target)] = {"c1"}
+    export_graph_snapshot(driver)
+    write_corpus_version()
+
+    bot = make_bot(neo4j_driver=driver)
+    queries = driver.queries
+    assert bot.graph_search("What did Ravi find?") == ["Ravi --[FOUND]--> Bird"]
+    assert driver.queries == queries
+
+    driver.edges[("Meena", "FRIEND_OF", "Ravi")] = {"c2"}
+    export_graph_snapshot(driver)
+    write_corpus_version()
+    _, context = bot.generate_response("Who is Meena?")
+    assert "Meena --[FRIEND_OF]--> Ravi" in context
+
+    # Without a snapshot, graph search goes back to Neo4j
+    bot.graph_snapshot = None
+    queries = driver.queries
+    assert bot.graph_search("What did Ravi find?")
+    assert driver.queries == queries + 1
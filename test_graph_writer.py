@@ -0,0 +1,59 @@
+from benchmark import synthetic_pages
+from fakes import FakeChatModel, FakeEmbeddings, FakeNeo4jDriver
+from graph_writer import GraphWriteBuffer, normalize_relationship
+from ingest_data import ingest_documents
+from ingest_manifest import IngestManifest
+from vector_store import LocalVectorStore
+
+
+def test_buffer_merges_spellings_and_writes_nodes_before_edges():
+    driver = FakeNeo4jDriver()
+    written = []
+    run = driver.run
+    driver.run = lambda query, params: written.append(next(iter(params))) or run(query, params)
+
+    buffer = GraphWriteBuffer(known_names=["Ravi"])
+    buffer.add("c1", {"nodes": [{"name": "ravi ", "type": "Character"}],
+                      "edges": [{"source": "RAVI", "target": "the  river", "relationship": "Lives Near"}]})
+    # No nodes at all: the edges must still be written
+    buffer.add("c2", {"nodes": [], "edges": [
+        {"source": "Ravi", "target": "The River", "relationship": "LIVES_NEAR"},
+        {"source": "ravi", "target": "Ravi", "relationship": "is"},
+    ]})
+    assert len(buffer) == 2
+
+    with driver.session() as session:
+        assert buffer.flush(session, batch_size=1) == ["c1", "c2"]
+    assert len(buffer) == 0
+    assert driver.nodes == {"Ravi": "Character", "the river": None}
+    assert driver.edges == {("Ravi", "lives_near", "the river"): {"c1", "c2"}}
+    assert written == ["nodes", "nodes", "edges"] and driver.transactions == 3
+    assert normalize_relationship("part-of") == "part_of"
+
+
+class FailingWrites(FakeNeo4jDriver):
+    def session(self, **kwargs):
+        session = super().session(**kwargs)
+        session.execute_write = lambda *args, **kwargs: (_ for _ in ()).throw(ConnectionError("write failed"))
+        return session
+
+
+def ingest(tmp_path, driver):
+    manifest_path = str(tmp_path / "manifest.json")
+    ingest_documents(synthetic_pages(5), "synthetic.pdf", embeddings_model=FakeEmbeddings(),
+                     collection=LocalVectorStore(str(tmp_path / "store")), llm=FakeChatModel(),
+                     driver=driver, manifest_path=manifest_path)
+    return IngestManifest(manifest_path).chunks
+
+
+def test_ingest_writes_the_graph_in_a_few_transactions(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    driver = FakeNeo4jDriver()
+    chunks = ingest(tmp_path, driver)
+    assert len(chunks) == 15 and all(c["graph"] for c in chunks.values())
+    assert driver.transactions == 2 and driver.edges
+
+    # A failed write leaves the chunks to be retried by the next run
+    (tmp_path / "retry").mkdir()
+    chunks = ingest(tmp_path / "retry", FailingWrites())
+    assert not any(c["graph"] for c in chunks.values())
@@ -0,0 +1,29 @@
+from ingest_manifest import IngestManifest, chunk_id
+
+
+def test_chunk_id_ignores_whitespace_only_changes():
+    assert chunk_id("The  turtle\nwon.") == chunk_id("The turtle won. ")
+    assert chunk_id("The turtle won.") != chunk_id("The hare won.")
+
+
+def test_plan_only_returns_changed_chunks(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = IngestManifest(path)
+    manifest.set_source("term1.pdf", ["a", "b", "c"])
+    manifest.mark_embedded(["a", "b"])
+    manifest.mark_graphed(["a"])
+    manifest.save()
+
+    reloaded = IngestManifest(path)
+    to_embed, to_extract, stale = reloaded.plan("term1.pdf", ["a", "c", "d"])
+    assert to_embed == ["c", "d"]
+    assert to_extract == ["c", "d"]
+    assert stale == ["b"]
+
+
+def test_chunk_shared_with_another_source_is_not_stale(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    manifest.set_source("term1.pdf", ["a", "shared"])
+    manifest.set_source("term2.pdf", ["shared"])
+    _, _, stale = manifest.plan("term1.pdf", ["a"])
+    assert stale == []
@@ -0,0 +1,55 @@
+from fakes import FakeEmbeddings
+from lexical_index import BM25Index, reciprocal_rank_fusion
+
+DOCS = {
+    "c1": "The turtle was slow but patient and won the race against the hare.",
+    "c2": "Ravi found a small bird near the river.",
+    "c3": "Vocabulary: 'meticulous' means showing great attention to detail.",
+    "c4": "The hare laughed at the turtle and fell asleep under a tree.",
+}
+
+
+def test_bm25_ranks_exact_terms_and_survives_a_reload(tmp_path):
+    index = BM25Index(str(tmp_path / "lexical"))
+    index.add(list(DOCS), list(DOCS.values()), [{"page": n} for n in range(4)])
+
+    assert [h["id"] for h in index.search("What does meticulous mean?")] == ["c3"]
+    hits = index.search("turtles and the hare")
+    assert {h["id"] for h in hits} == {"c1", "c4"} and hits[0]["relevance"] == 1.0
+    assert index.search("spaceship") == []
+
+    index.remove(["c1"])
+    index.save()
+    reloaded = BM25Index(str(tmp_path / "lexical"))
+    assert len(reloaded) == 3 and "c1" not in reloaded
+    assert [h["id"] for h in reloaded.search("turtle")] == ["c4"]
+    assert reloaded.search("Ravi bird")[0]["metadata"] == {"page": 1}
+
+
+def test_rank_fusion_rewards_agreement():
+    vector = [{"id": "a", "embedding": [1.0]}, {"id": "b", "embedding": [0.5]}]
+    lexical = [{"id": "b", "embedding": None}, {"id": "c", "embedding": None}]
+    fused = reciprocal_rank_fusion([vector, lexical])
+    assert [c["id"] for c in fused] == ["b", "a", "c"]
+    assert fused[0]["relevance"] == 1.0 and fused[0]["embedding"] == [0.5]
+
+
+class DownEmbeddings(FakeEmbeddings):
+    def embed_query(self, text):
+        self.calls += 1
+        raise ConnectionError("embedding service unavailable")
+
+
+def test_questions_are_answered_from_the_lexical_index_when_embedding_is_down(make_bot):
+    index = BM25Index()
+    index.add(list(DOCS), list(DOCS.values()))
+    index.save()
+
+    embeddings = DownEmbeddings()
+    bot = make_bot(embeddings=embeddings)
+    _, context = bot.generate_response("What does meticulous mean?")
+    assert "attention to detail" in context
+
+    # The outage is remembered, so the next question doesn't wait on embedding again
+    bot.generate_response("Who won the race?")
+    assert embeddings.calls == 1
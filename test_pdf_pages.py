@@ -0,0 +1,83 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_core.documents import Document
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+import ingest_data
+from fakes import FakeChatModel, FakeEmbeddings, FakeNeo4jDriver
+from ingest_manifest import IngestManifest
+from pdf_pages import find_pdfs, iter_pdf_pages
+from vector_store import LocalVectorStore
+
+
+def write_pdf(path, page_texts):
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    for text in page_texts:
+        page = writer.add_blank_page(width=612, height=792)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)})
+        })
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(content)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def test_pages_come_back_in_order_from_the_process_pool(tmp_path):
+    path = str(tmp_path / "book.pdf")
+    write_pdf(path, [f"Page {n} about Ravi" for n in range(7)])
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        pages = list(iter_pdf_pages(path, pool, pages_per_task=2, max_pending=2))
+
+    assert [p.metadata["page"] for p in pages] == list(range(7))
+    assert all(f"Page {n}" in p.page_content for n, p in enumerate(pages))
+    assert pages[0].metadata == {"source": path, "page": 0, "total_pages": 7}
+    assert [p.page_content for p in iter_pdf_pages(path)] == [p.page_content for p in pages]
+
+
+def test_find_pdfs_expands_directories(tmp_path):
+    (tmp_path / "class6").mkdir()
+    for name in ("class6/term2.pdf", "class6/term1.pdf", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    assert find_pdfs([str(tmp_path), str(tmp_path / "missing.pdf")]) == [
+        str(tmp_path / "class6" / "term1.pdf"), str(tmp_path / "class6" / "term2.pdf")]
+
+
+def test_streaming_ingest_with_small_queues(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_data, "INGEST_QUEUE_SIZE", 2)
+    monkeypatch.setattr(ingest_data, "INGEST_BATCH_SIZE", 3)
+    monkeypatch.chdir(tmp_path)
+    pulled = []
+
+    def pages():
+        for n in range(12):
+            pulled.append(n)
+            yield Document(page_content=f"Page {n}: Ravi met Meena near the river number {n}.",
+                           metadata={"page": n})
+
+    collection = LocalVectorStore(str(tmp_path / "store"))
+    driver = FakeNeo4jDriver()
+    embeddings = FakeEmbeddings()
+    manifest_path = str(tmp_path / "manifest.json")
+    kwargs = dict(embeddings_model=embeddings, collection=collection, llm=FakeChatModel(),
+                  driver=driver, manifest_path=manifest_path)
+    ingest_data.ingest_documents(pages(), "book.pdf", **kwargs)
+
+    assert pulled == list(range(12))
+    assert collection.count() == 12
+    manifest = IngestManifest(manifest_path)
+    assert len(manifest.sources["book.pdf"]) == 12
+    assert all(r["embedded"] and r["graph"] for r in manifest.chunks.values())
+
+    # A second run has nothing left to do
+    calls = embeddings.calls
+    ingest_data.ingest_documents(pages(), "book.pdf", **kwargs)
+    assert embeddings.calls == calls
@@ -4,10 +4,12 @@ from rag_bot import RAGBot
 
 def test_rag_system():
     print("Initializing RAG Bot (Chroma + Neo4j)...")
-    try:
-        bot = RAGBot()
-    except Exception as e:
-        print(f"Failed to initialize bot: {e}")
+    bot = RAGBot()
+    status = bot.warmup()
+    for name, check in status["checks"].items():
+        print(f"  {name}: {'ok' if check['ok'] else 'FAILED'} ({check['detail']})")
+    if not status["ok"]:
+        print("Failed to initialize bot.")
         print("Please ensure .env is set up correctly.")
         return
 
@@ -20,21 +22,21 @@ def test_rag_system():
 
     print("\n--- Starting Verification Tests ---")
 
-    for q in test_questions:
+    # One batch: a single embedding call, vector query and graph query for all questions
+    for result in bot.generate_batch(test_questions):
+        q, answer = result["question"], result["answer"]
         print(f"\nTest Question: {q}")
-        try:
-            answer, context = bot.generate_response(q)
-            print(f"Answer: {answer}")
-            
-            if "cannot find" in answer.lower() and "France" in q:
-                print("✅ Hallucination Check Passed")
-            elif "cannot find" not in answer.lower() and "France" not in q:
-                print("✅ Answer Generated")
-            else:
-                print("⚠️ Check Answer Quality")
-                
-        except Exception as e:
-            print(f"❌ Test Failed: {e}")
+        if result["error"]:
+            print(f"❌ Test Failed: {result['error']}")
+            continue
+        print(f"Answer: {answer}")
+        
+        if "cannot find" in answer.lower() and "France" in q:
+            print("✅ Hallucination Check Passed")
+        elif "cannot find" not in answer.lower() and "France" not in q:
+            print("✅ Answer Generated")
+        else:
+            print("⚠️ Check Answer Quality")
 
 if __name__ == "__main__":
     test_rag_system()
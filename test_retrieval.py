@@ -0,0 +1,50 @@
+import time
+
+import rag_bot
+from fakes import FakeNeo4jDriver
+from lexical_index import BM25Index
+
+
+def test_slow_graph_search_degrades_to_text_only_context(make_bot, monkeypatch):
+    monkeypatch.setattr(rag_bot, "GRAPH_SEARCH_TIMEOUT", 0.3)
+    index = BM25Index()
+    index.add(["c1"], ["Ravi found a small bird near the river."])
+    index.save()
+    driver = FakeNeo4jDriver(latency=2.0)
+    driver.nodes = {"Ravi": "Character"}
+    driver.edges = {("Ravi", "FOUND", "Bird"): {"c1"}}
+    bot = make_bot(neo4j_driver=driver)
+
+    start = time.perf_counter()
+    answer, context = bot.generate_response("What did Ravi find?")
+    assert time.perf_counter() - start < 1.0
+    assert answer.startswith("Answer based on")
+    assert "small bird near the river" in context
+    assert context.split("### KNOWLEDGE GRAPH:")[1].strip() == ""
+
+
+def test_stream_yields_tokens_then_returns_the_context(make_bot):
+    bot = make_bot()
+
+    stream = bot.generate_response_stream("What did Ravi find?", "s1")
+    tokens = [next(stream)]
+    assert bot.memory.load("s1") == []
+    try:
+        while True:
+            tokens.append(next(stream))
+    except StopIteration as stop:
+        context = stop.value
+
+    assert len(tokens) > 1 and "".join(tokens).startswith("Answer based on")
+    assert context.startswith("### TEXT SOURCES:")
+    assert [m.content for m in bot.memory.load("s1")] == ["What did Ravi find?", "".join(tokens)]
+    trace = bot.last_trace("s1")
+    assert trace.duration is not None
+    assert "answer.first_token" in [name for name, _, _ in trace.spans]
+
+    # Abandoning the stream still publishes the trace, but remembers nothing
+    stream = bot.generate_response_stream("Who is Meena?", "s2")
+    next(stream)
+    stream.close()
+    assert bot.last_trace("s2").duration is not None
+    assert bot.memory.load("s2") == []
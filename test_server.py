@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from answer_cache import SemanticAnswerCache
+from fakes import FakeChatModel, FakeNeo4jDriver
+from server import create_app
+
+
+def service_bot(make_bot, latency=0.0):
+    driver = FakeNeo4jDriver()
+    driver.nodes = {"Ravi": "Character"}
+    bot = make_bot(neo4j_driver=driver, llm=FakeChatModel(latency=latency))
+    bot.answer_cache = SemanticAnswerCache(max_entries=0)
+    return bot
+
+
+def serve(app, scenario):
+    async def main():
+        async with TestClient(TestServer(app)) as client:
+            return await scenario(client)
+    return asyncio.run(main())
+
+
+def sse_events(body):
+    return [(block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+            for block in body.strip().split("\n\n")]
+
+
+def test_json_and_streaming_answers(make_bot):
+    bot = service_bot(make_bot)
+
+    async def scenario(client):
+        response = await client.post("/ask", json={"question": "What did Ravi find?", "session_id": "s1"})
+        answer = await response.json()
+        stream = await client.post("/ask/stream", json={"question": "Tell me more", "session_id": "s1"})
+        events = sse_events(await stream.text())
+        bad = await client.post("/ask", json={"q": "missing"})
+        health = await client.get("/health")
+        return answer, stream.headers["Content-Type"], events, bad.status, await health.json()
+
+    answer, content_type, events, bad_status, health = serve(create_app(bot), scenario)
+    assert answer["answer"].startswith("Answer based on") and not answer["shared"]
+    assert "### TEXT SOURCES:" in answer["context"]
+    assert content_type.startswith("text/event-stream")
+    assert [name for name, _ in events[:-1]] == ["token"] * (len(events) - 1)
+    assert "".join(data["text"] for _, data in events[:-1]).startswith("Answer based on")
+    assert events[-1][0] == "done" and "### KNOWLEDGE GRAPH:" in events[-1][1]["context"]
+    assert len(bot.memory.load("s1")) == 4
+    assert bad_status == 400
+    assert health["ok"] and health["service"]["running"] == 0
+
+
+def test_identical_questions_share_one_run(make_bot):
+    bot = service_bot(make_bot, latency=0.3)
+
+    async def scenario(client):
+        asks = [client.post("/ask", json={"question": q}) for q in
+                ("Who is Ravi?", "who is  RAVI?", "Who is Ravi?", "Where does Ravi live?")]
+        asks.append(client.post("/ask/stream", json={"question": "Who is Ravi?"}))
+        responses = await asyncio.gather(*asks)
+        return [await r.json() for r in responses[:4]], sse_events(await responses[4].text())
+
+    results, events = serve(create_app(bot), scenario)
+    assert bot.llm.calls == 2
+    assert sorted(r["shared"] for r in results[:3]) == [False, True, True]
+    assert results[0]["answer"] == results[1]["answer"] == results[2]["answer"]
+    assert events[-1][1]["shared"]
+    # Sessionless questions leave nothing behind in memory
+    assert len(bot.memory) == 0
+
+
+def test_requests_beyond_the_queue_are_refused(make_bot):
+    bot = service_bot(make_bot, latency=0.3)
+
+    async def scenario(client):
+        responses = await asyncio.gather(*[client.post("/ask", json={"question": f"Question {n} about Ravi"})
+                                           for n in range(4)])
+        return [(r.status, r.headers.get("Retry-After")) for r in responses]
+
+    statuses = serve(create_app(bot, max_concurrency=1, max_queue=2), scenario)
+    assert sorted(statuses, key=str) == [(200, None)] * 3 + [(503, "1")]
+
+
+def test_index_reload_after_ingest_runs_off_the_event_loop(make_bot, monkeypatch):
+    import time
+    from ingest_manifest import write_corpus_version
+    bot = service_bot(make_bot)
+    reload = bot.refresh_graph_snapshot
+    monkeypatch.setattr(bot, "refresh_graph_snapshot", lambda: time.sleep(0.5) or reload())
+    write_corpus_version()
+
+    async def main():
+        gaps = []
+
+        async def ticker():
+            last = time.perf_counter()
+            while True:
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        ticking = asyncio.create_task(ticker())
+        await bot.agenerate_response("Who is Ravi?")
+        ticking.cancel()
+        return max(gaps)
+
+    assert asyncio.run(main()) < 0.25
@@ -0,0 +1,53 @@
+import time
+
+from session_memory import SessionMemoryStore
+
+
+def test_sessions_are_isolated():
+    memory = SessionMemoryStore()
+    memory.save("alice", "Who is Ravi?", "A boy.")
+    assert [m.content for m in memory.load("alice")] == ["Who is Ravi?", "A boy."]
+    assert memory.load("bob") == []
+
+
+def test_window_stays_within_token_budget_and_summarizes_overflow():
+    summarized = []
+
+    def summarizer(summary, messages):
+        summarized.extend(m.content for m in messages)
+        return "talked about chapter one"
+
+    memory = SessionMemoryStore(max_tokens=30, summarizer=summarizer)
+    for i in range(10):
+        memory.save("s", f"question number {i} " * 3, f"answer number {i} " * 3)
+
+    history = memory.load("s")
+    assert history[0].content.endswith("talked about chapter one")
+    assert sum(len(m.content) // 4 for m in history[1:]) <= 30
+    assert history[-1].content.startswith("answer number 9")
+    assert "question number 0 " * 3 in summarized
+
+
+def test_idle_sessions_are_evicted():
+    memory = SessionMemoryStore(idle_ttl=0.01)
+    memory.save("old", "q", "a")
+    time.sleep(0.02)
+    memory.load("new")
+    assert len(memory) == 1
+    assert memory.load("old") == []
+
+
+def test_background_summary_does_not_hold_up_save():
+    def slow_summarizer(summary, messages):
+        time.sleep(0.3)
+        return "talked about chapter one"
+
+    memory = SessionMemoryStore(max_tokens=10, summarizer=slow_summarizer)
+    start = time.perf_counter()
+    for i in range(3):
+        memory.save("s", f"question number {i} " * 3, f"answer number {i} " * 3, wait=False)
+    assert time.perf_counter() - start < 0.2
+    assert memory.load("s")[-1].content.startswith("answer number 2")
+
+    memory.flush()
+    assert memory.load("s")[0].content.endswith("talked about chapter one")
@@ -0,0 +1,79 @@
+import json
+import subprocess
+import sys
+import time
+
+import rag_bot
+from fakes import FakeChatModel, FakeEmbeddings, FakeNeo4jDriver
+from graph_snapshot import export_graph_snapshot
+from lexical_index import BM25Index
+from rag_bot import RAGBot
+
+HEAVY_MODULES = ("langchain_openai", "openai", "neo4j", "chromadb")
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import rag_bot
+print(json.dumps({"seconds": time.perf_counter() - start,
+                  "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def test_import_defers_heavy_clients():
+    result = json.loads(subprocess.run([sys.executable, "-c", IMPORT_PROBE], capture_output=True,
+                                       text=True, check=True).stdout.strip().splitlines()[-1])
+    print(f"import rag_bot: {1000 * result['seconds']:.0f} ms")
+    assert result["loaded"] == []
+    # Eager imports took ~3 s; generous bound so slow machines don't flake
+    assert result["seconds"] < 2.5
+
+
+def test_constructor_survives_unreachable_backends(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setenv("NEO4J_URI", "bolt://127.0.0.1:1")
+
+    def unreachable():
+        raise ConnectionError("vector store unreachable")
+    monkeypatch.setattr(rag_bot, "open_vector_store", unreachable)
+
+    start = time.perf_counter()
+    bot = RAGBot()
+    assert time.perf_counter() - start < 0.5
+
+    status = bot.health()
+    assert status["ok"] is False
+    assert not status["checks"]["vector_store"]["ok"]
+    assert "unreachable" in status["checks"]["vector_store"]["detail"]
+    assert not status["checks"]["graph"]["ok"]
+
+
+def test_warmup_opens_everything_and_reports_healthy(make_bot):
+    index = BM25Index()
+    index.add(["c1"], ["Ravi found a small bird near the river."])
+    index.save()
+    driver = FakeNeo4jDriver()
+    driver.nodes = {"Ravi": "Character", "Bird": "Animal"}
+    export_graph_snapshot(driver)
+    embeddings = FakeEmbeddings()
+    bot = make_bot(neo4j_driver=driver, embeddings=embeddings)
+
+    status = bot.warmup()
+    assert status["ok"], status
+    assert embeddings.calls == 1
+    assert len(bot.entity_index) == 2
+    assert status["checks"]["lexical_index"]["detail"] == "1 chunks"
+    assert all(check["latency_ms"] is not None for check in status["checks"].values())
+
+
+def test_health_probes_the_models(make_bot):
+    def api_down(prompt):
+        raise ConnectionError("chat API unreachable")
+    embeddings = FakeEmbeddings()
+    bot = make_bot(embeddings=embeddings, llm=FakeChatModel(responder=api_down))
+
+    status = bot.health()
+    assert status["ok"] is False
+    assert "unreachable" in status["checks"]["llm"]["detail"]
+    assert status["checks"]["embeddings"]["ok"] and embeddings.calls == 1
@@ -0,0 +1,48 @@
+import asyncio
+
+import tracing
+from tracing import MetricsRegistry, Trace
+
+
+def test_trace_records_spans_counts_and_feeds_metrics():
+    metrics = MetricsRegistry()
+    trace = Trace("query", metrics=metrics)
+    with trace.span("vector_search.query"):
+        pass
+    trace.add("retrieved.chunks", 3)
+    trace.finish()
+    trace.finish()
+
+    snapshot = metrics.snapshot()
+    assert snapshot["spans"]["query"]["count"] == 1
+    assert snapshot["spans"]["vector_search.query"]["count"] == 1
+    assert snapshot["counters"] == {"retrieved.chunks": 3}
+    prometheus = metrics.to_prometheus()
+    assert 'ragbot_span_seconds_count{span="vector_search.query"} 1' in prometheus
+    assert 'ragbot_total{name="retrieved.chunks"} 3' in prometheus
+
+
+def test_module_helpers_use_the_current_trace_per_context():
+    async def request(name):
+        trace = tracing.start_trace(name)
+        await asyncio.sleep(0)
+        with tracing.span("step"):
+            tracing.add("items", 2)
+        return trace
+
+    async def main():
+        return await asyncio.gather(request("a"), request("b"))
+
+    first, second = asyncio.run(main())
+    assert [s[0] for s in first.spans] == ["step"]
+    assert first.counts == {"items": 2} and second.counts == {"items": 2}
+    assert tracing.current_trace() is tracing.NULL_TRACE
+
+
+def test_disabled_tracing_is_a_no_op(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", False)
+    trace = tracing.start_trace("query")
+    assert trace is tracing.NULL_TRACE
+    with tracing.span("anything"):
+        tracing.add("items")
+    assert trace.to_dict() == {}
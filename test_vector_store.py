@@ -0,0 +1,75 @@
+import numpy as np
+
+from vector_store import LocalVectorStore
+
+
+def _store(path, dtype="float32"):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 32)).astype(np.float32)
+    store = LocalVectorStore(str(path), dtype=dtype)
+    store.upsert([f"c{i}" for i in range(50)], [f"doc {i}" for i in range(50)],
+                 vectors.tolist(), [{"page": i} for i in range(50)])
+    return store, vectors
+
+
+def test_query_returns_nearest_in_chroma_shape(tmp_path):
+    store, vectors = _store(tmp_path)
+    result = store.query(query_embeddings=[vectors[7] * 3, vectors[20]], n_results=3)
+    assert result["ids"][0][0] == "c7"
+    assert result["ids"][1][0] == "c20"
+    assert result["documents"][0][0] == "doc 7"
+    assert abs(result["distances"][0][0]) < 1e-5
+
+
+def test_quantized_store_persists_upserts_and_deletes(tmp_path):
+    store, vectors = _store(tmp_path, dtype="int8")
+    store.upsert(["c3"], ["doc 3 revised"], [vectors[3].tolist()], [{"page": 3}])
+    store.delete(["c0"])
+
+    reopened = LocalVectorStore(str(tmp_path))
+    assert reopened.dtype == "int8"
+    assert reopened.count() == 49
+    result = reopened.query([vectors[3]], n_results=1)
+    assert result["documents"][0] == ["doc 3 revised"]
+
+
+def test_upserts_append_and_skip_an_interrupted_write(tmp_path):
+    import os
+    store, vectors = _store(tmp_path)
+    # Leftovers of a batch that crashed before meta.json was replaced
+    with open(tmp_path / "vectors.0.bin", "ab") as f:
+        f.write(b"\0" * 100)
+    with open(tmp_path / "rows.0.jsonl", "ab") as f:
+        f.write(b'[50, "lost", "half a')
+
+    reopened = LocalVectorStore(str(tmp_path))
+    assert reopened.count() == 50
+    reopened.upsert(["c50"], ["doc 50"], [vectors[0] * -1], [{"page": 50}])
+    assert os.path.getsize(tmp_path / "vectors.0.bin") == 51 * 32 * 4
+
+    reopened = LocalVectorStore(str(tmp_path))
+    assert reopened.get(["c50", "lost"])["documents"] == ["doc 50"]
+    assert reopened.query([vectors[0] * -1], n_results=1)["ids"] == [["c50"]]
+
+
+def test_bot_stops_returning_chunks_removed_by_a_later_ingest(tmp_path, make_bot):
+    from langchain_core.documents import Document
+
+    from fakes import FakeChatModel, FakeEmbeddings, FakeNeo4jDriver
+    from ingest_data import ingest_documents
+
+    def ingest(text):
+        # A separate store instance, as when ingest_data.py runs in its own process
+        ingest_documents([Document(page_content=text, metadata={"page": 0})], "story.pdf",
+                         embeddings_model=FakeEmbeddings(), collection=LocalVectorStore(str(tmp_path / "store")),
+                         llm=FakeChatModel(), driver=FakeNeo4jDriver(),
+                         manifest_path=str(tmp_path / "manifest.json"))
+
+    ingest("Ravi found a small bird under the mango tree.")
+    bot = make_bot()
+    assert "mango tree" in bot.vector_search("mango tree")[0]["text"]
+
+    ingest("Meena planted a row of sunflowers by the well.")
+    bot.generate_response("Where did Meena plant sunflowers?")
+    assert [hit["text"] for hit in bot.vector_search("mango tree")] == \
+           ["Meena planted a row of sunflowers by the well."]
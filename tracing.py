@@ -0,0 +1,242 @@
+"""Lightweight request tracing: timed spans, token/item counters and rolling histograms.
+
+A Trace collects the spans of one request (a question or an ingest run). The
+active trace lives in a context variable, so code deep in the call stack can
+call `span("vector_search.query")` or `add("retrieved.chunks", 3)` without
+threading it through arguments. Finished traces feed the process-wide METRICS
+registry, which keeps rolling histograms and exports JSON or Prometheus text.
+
+Set TRACING_ENABLED=0 to turn it off: start_trace() then returns a shared
+no-op trace and span() a shared null context manager.
+"""
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+
+# Upper bounds (seconds) of the cumulative Prometheus histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative bucket counts plus a window of recent samples for percentiles."""
+
+    def __init__(self, window=1000):
+        self.recent = deque(maxlen=window)
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.recent.append(value)
+        self.count += 1
+        self.sum += value
+        index = bisect.bisect_left(BUCKETS, value)
+        if index < len(self.buckets):
+            self.buckets[index] += 1
+
+    def percentile(self, pct):
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))]
+
+
+class MetricsRegistry:
+    """Process-wide span histograms and counters, fed by finished traces."""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.window)
+            histogram.observe(seconds)
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        with self._lock:
+            spans = {
+                name: {
+                    "count": h.count,
+                    "mean_ms": 1000 * h.sum / h.count if h.count else 0.0,
+                    "p50_ms": 1000 * h.percentile(50),
+                    "p95_ms": 1000 * h.percentile(95),
+                    "p99_ms": 1000 * h.percentile(99),
+                }
+                for name, h in sorted(self._histograms.items())
+            }
+            return {"spans": spans, "counters": dict(sorted(self._counters.items()))}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = [
+            "# HELP ragbot_span_seconds Duration of traced pipeline stages.",
+            "# TYPE ragbot_span_seconds histogram",
+        ]
+        with self._lock:
+            for name, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, h.buckets):
+                    cumulative += count
+                    lines.append(f'ragbot_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'ragbot_span_seconds_bucket{{span="{name}",le="+Inf"}} {h.count}')
+                lines.append(f'ragbot_span_seconds_sum{{span="{name}"}} {h.sum}')
+                lines.append(f'ragbot_span_seconds_count{{span="{name}"}} {h.count}')
+            lines.append("# HELP ragbot_total Token and item counters.")
+            lines.append("# TYPE ragbot_total counter")
+            for name, value in sorted(self._counters.items()):
+                lines.append(f'ragbot_total{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+
+class Trace:
+    """Spans and counters of one request; finish() publishes them to METRICS."""
+
+    def __init__(self, name, metrics=METRICS):
+        self.name = name
+        self.metrics = metrics
+        self.started = time.perf_counter()
+        self.duration = None
+        self.spans = []  # (name, offset seconds, duration seconds)
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, offset=None):
+        if offset is None:
+            offset = time.perf_counter() - self.started - seconds
+        with self._lock:
+            self.spans.append((name, offset, seconds))
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.record(name, end - start, start - self.started)
+
+    def add(self, name, value=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def add_usage(self, message):
+        """Adds the token usage reported on an LLM message, if any."""
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            self.add("tokens.input", usage.get("input_tokens", 0))
+            self.add("tokens.output", usage.get("output_tokens", 0))
+
+    def finish(self):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.started
+        self.metrics.observe(self.name, self.duration)
+        for name, _, seconds in self.spans:
+            self.metrics.observe(name, seconds)
+        for name, value in self.counts.items():
+            self.metrics.increment(name, value)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "duration_ms": 1000 * (self.duration or 0.0),
+            "spans": [{"name": n, "start_ms": 1000 * o, "duration_ms": 1000 * d}
+                      for n, o, d in sorted(self.spans, key=lambda s: s[1])],
+            "counts": dict(self.counts),
+        }
+
+    def format(self):
+        """Plain-text breakdown for logs and the debug expander.
+
+        Repeated spans (e.g. one per ingest batch) are summed onto one line.
+        """
+        lines = [f"{self.name}: {1000 * (self.duration or 0.0):.0f} ms"]
+        totals = {}
+        for name, offset, seconds in sorted(self.spans, key=lambda s: s[1]):
+            first, total, count = totals.get(name, (offset, 0.0, 0))
+            totals[name] = (first, total + seconds, count + 1)
+        for name, (offset, seconds, count) in totals.items():
+            repeat = f" x{count}" if count > 1 else ""
+            lines.append(f"  {name:<32}{1000 * seconds:>8.1f} ms  (at +{1000 * offset:.0f} ms{repeat})")
+        for name, value in sorted(self.counts.items()):
+            lines.append(f"  {name:<32}{value:>8}")
+        return "\n".join(lines)
+
+
+class _NullTrace:
+    """Stand-in used when tracing is disabled; every method is a no-op."""
+    name = None
+    duration = None
+    _span = nullcontext()
+
+    def record(self, name, seconds, offset=None):
+        pass
+
+    def span(self, name):
+        return self._span
+
+    def add(self, name, value=1):
+        pass
+
+    def add_usage(self, message):
+        pass
+
+    def finish(self):
+        pass
+
+    def to_dict(self):
+        return {}
+
+    def format(self):
+        return ""
+
+
+NULL_TRACE = _NullTrace()
+
+_current = contextvars.ContextVar("ragbot_trace", default=NULL_TRACE)
+
+
+def start_trace(name):
+    """Starts a trace and makes it current for this context."""
+    trace = Trace(name) if TRACING_ENABLED else NULL_TRACE
+    _current.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current.get()
+
+
+def span(name):
+    return _current.get().span(name)
+
+
+def add(name, value=1):
+    _current.get().add(name, value)
@@ -0,0 +1,316 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# "chroma" (Chroma Cloud, the default) or "local" (LocalVectorStore below)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")
+LOCAL_VECTOR_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH", os.path.join("data", "vector_store"))
+# Storage precision for the local store: float32, float16 or int8
+LOCAL_VECTOR_STORE_DTYPE = os.getenv("LOCAL_VECTOR_STORE_DTYPE", "float32")
+COLLECTION_NAME = "textbook_rag"
+
+
+def save_with_sidecar(path, arrays, meta):
+    """Saves a store directory: numpy files first, then the meta.json sidecar.
+
+    `arrays` maps file names to an array (written with np.save) or a dict of
+    arrays (one compressed .npz). Every file is written to a temporary name
+    and swapped in with os.replace. The sidecar goes last because loaders
+    trust it for the row count, so a crash mid-save never leaves a sidecar
+    describing arrays that were not written.
+    """
+    os.makedirs(path, exist_ok=True)
+    for name, data in arrays.items():
+        tmp_path = os.path.join(path, name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            if isinstance(data, dict):
+                np.savez_compressed(f, **data)
+            else:
+                np.save(f, data)
+        os.replace(tmp_path, os.path.join(path, name))
+    tmp_path = os.path.join(path, "meta.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(path, "meta.json"))
+
+
+class LocalVectorStore:
+    """Embedded vector store: a pre-normalized embedding matrix plus a row log.
+
+    Exposes the subset of the Chroma collection API that ingest_data and
+    RAGBot use (upsert, delete, query, get, count), so it is a drop-in
+    replacement. Rows are L2-normalized on insert, so cosine similarity is a
+    single matrix-vector product; top-k uses argpartition.
+
+    On disk the matrix is a raw file that upsert appends to, memory-mapped on
+    load, so neither opening the store nor adding a batch reads the rows
+    already stored. Ids, texts and metadata are appended to a JSON-lines log
+    (a later line for a row replaces an earlier one). meta.json holds the row
+    count and log length and is replaced last, so a crash mid-write leaves the
+    previous contents. delete() compacts into a new generation of files.
+
+    dtype may be "float32", "float16" (half the memory) or "int8" (a quarter,
+    with a per-row scale factor).
+    """
+
+    def __init__(self, path=LOCAL_VECTOR_STORE_PATH, dtype=LOCAL_VECTOR_STORE_DTYPE):
+        if dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported vector store dtype: {dtype}")
+        self.path = path
+        self._lock = threading.Lock()
+        self.dtype = dtype
+        self.reload()
+
+    # --- persistence -------------------------------------------------------
+
+    def reload(self):
+        """Re-reads the store from disk, e.g. after another process ingested into it."""
+        with self._lock:
+            self.ids = []
+            self.documents = []
+            self.metadatas = []
+            self.dim = None
+            self.generation = 0
+            self._log_bytes = 0
+            self._matrix = None
+            self._scales = None
+            self._index = {}
+            self._load()
+
+    def _file(self, name, generation=None):
+        if generation is not None:
+            stem, ext = os.path.splitext(name)
+            name = f"{stem}.{generation}{ext}"
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        meta_path = self._file("meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if "count" not in meta:
+            raise ValueError(f"Vector store at {self.path} uses an older format; "
+                             f"delete it and re-run ingestion with --full.")
+        self.dtype, self.dim, self.generation = meta["dtype"], meta["dim"], meta["generation"]
+        count, self._log_bytes = meta["count"], meta["log_bytes"]
+        self.ids, self.documents, self.metadatas = [None] * count, [None] * count, [None] * count
+        with open(self._file("rows.jsonl", self.generation), "rb") as f:
+            log = f.read(self._log_bytes)
+        for line in log.splitlines():
+            row, id_, document, metadata = json.loads(line)
+            self.ids[row], self.documents[row], self.metadatas[row] = id_, document, metadata
+        if None in self.ids:
+            raise ValueError(f"Vector store at {self.path} is inconsistent; re-run ingestion with --full.")
+        self._index = {id_: row for row, id_ in enumerate(self.ids)}
+        self._map(count)
+
+    def _map(self, count):
+        """Memory-maps the first `count` rows of the matrix (and scales) files."""
+        if not count:
+            self._matrix = self._scales = None
+            return
+        matrix_path = self._file("vectors.bin", self.generation)
+        if os.path.getsize(matrix_path) < count * self.dim * np.dtype(self.dtype).itemsize:
+            raise ValueError(f"Vector store at {self.path} is inconsistent; re-run ingestion with --full.")
+        self._matrix = np.memmap(matrix_path, dtype=self.dtype, mode="r", shape=(count, self.dim))
+        if self.dtype == "int8":
+            self._scales = np.memmap(self._file("scales.bin", self.generation), dtype=np.float32, mode="r",
+                                     shape=(count,))
+
+    def _write_meta(self, count):
+        tmp_path = self._file("meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dtype": self.dtype, "dim": self.dim, "count": count, "log_bytes": self._log_bytes,
+                       "generation": self.generation}, f)
+        os.replace(tmp_path, self._file("meta.json"))
+
+    @staticmethod
+    def _log_lines(records):
+        return b"".join((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8") for record in records)
+
+    # --- encoding ----------------------------------------------------------
+
+    def _encode(self, embeddings):
+        """Normalizes rows and converts them to the storage dtype; returns (rows, scales)."""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+        if self.dtype == "int8":
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return vectors.astype(self.dtype), None
+
+    def _decode(self, rows):
+        vectors = np.asarray(self._matrix[rows], dtype=np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    # --- collection API ----------------------------------------------------
+
+    def count(self):
+        return len(self.ids)
+
+    def upsert(self, ids, documents, embeddings, metadatas=None):
+        if not ids:
+            return
+        metadatas = metadatas or [{} for _ in ids]
+        rows, scales = self._encode(embeddings)
+        with self._lock:
+            if self.dim is None:
+                self.dim = rows.shape[1]
+            elif rows.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional embeddings, got {rows.shape[1]}.")
+            os.makedirs(self.path, exist_ok=True)
+            count = len(self.ids)
+            row_bytes = self.dim * rows.itemsize
+            matrix_path = self._file("vectors.bin", self.generation)
+            scales_path = self._file("scales.bin", self.generation)
+            log_path = self._file("rows.jsonl", self.generation)
+
+            # The last occurrence of an id in the batch wins
+            latest = {id_: i for i, id_ in enumerate(ids)}
+            replaced = [(self._index[id_], i) for id_, i in latest.items() if id_ in self._index]
+            added = [i for id_, i in latest.items() if id_ not in self._index]
+            records = [[row, ids[i], documents[i], metadatas[i]] for row, i in replaced]
+            records += [[count + n, ids[i], documents[i], metadatas[i]] for n, i in enumerate(added)]
+
+            # Anything past the committed lengths is left over from an interrupted write
+            with open(matrix_path, "a+b") as f:
+                f.truncate(count * row_bytes)
+                for row, i in replaced:
+                    f.seek(row * row_bytes)
+                    f.write(rows[i].tobytes())
+                f.seek(0, os.SEEK_END)
+                f.write(rows[added].tobytes())
+            if scales is not None:
+                with open(scales_path, "a+b") as f:
+                    f.truncate(count * 4)
+                    for row, i in replaced:
+                        f.seek(row * 4)
+                        f.write(scales[i].tobytes())
+                    f.seek(0, os.SEEK_END)
+                    f.write(scales[added].tobytes())
+            log = self._log_lines(records)
+            with open(log_path, "a+b") as f:
+                f.truncate(self._log_bytes)
+                f.write(log)
+            self._log_bytes += len(log)
+            count += len(added)
+            # The sidecar goes last: it is what _load trusts for the row and log lengths
+            self._write_meta(count)
+
+            for row, i in replaced:
+                self.documents[row] = documents[i]
+                self.metadatas[row] = metadatas[i]
+            for i in added:
+                self._index[ids[i]] = len(self.ids)
+                self.ids.append(ids[i])
+                self.documents.append(documents[i])
+                self.metadatas.append(metadatas[i])
+            self._map(count)
+
+    def delete(self, ids):
+        with self._lock:
+            drop = {self._index[i] for i in ids if i in self._index}
+            if not drop:
+                return
+            keep = np.array([row for row in range(len(self.ids)) if row not in drop], dtype=np.int64)
+            old_generation, self.generation = self.generation, self.generation + 1
+            # Compact into the next generation's files, a block of rows at a time
+            with open(self._file("vectors.bin", self.generation), "wb") as f:
+                for start in range(0, len(keep), 4096):
+                    f.write(np.ascontiguousarray(self._matrix[keep[start:start + 4096]]).tobytes())
+            if self._scales is not None:
+                with open(self._file("scales.bin", self.generation), "wb") as f:
+                    f.write(np.ascontiguousarray(self._scales[keep]).tobytes())
+            self.ids = [self.ids[row] for row in keep]
+            self.documents = [self.documents[row] for row in keep]
+            self.metadatas = [self.metadatas[row] for row in keep]
+            log = self._log_lines([row, self.ids[row], self.documents[row], self.metadatas[row]]
+                                  for row in range(len(self.ids)))
+            with open(self._file("rows.jsonl", self.generation), "wb") as f:
+                f.write(log)
+            self._log_bytes = len(log)
+            self._write_meta(len(self.ids))
+            self._index = {id_: row for row, id_ in enumerate(self.ids)}
+            self._map(len(self.ids))
+            for name in ("vectors.bin", "scales.bin", "rows.jsonl"):
+                if os.path.exists(self._file(name, old_generation)):
+                    os.remove(self._file(name, old_generation))
+
+    def get(self, ids, include=("documents", "metadatas")):
+        rows = [self._index[i] for i in ids if i in self._index]
+        result = {"ids": [self.ids[r] for r in rows]}
+        if "documents" in include:
+            result["documents"] = [self.documents[r] for r in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [self.metadatas[r] for r in rows]
+        if "embeddings" in include:
+            result["embeddings"] = self._decode(rows) if rows else np.zeros((0, 0), np.float32)
+        return result
+
+    def query(self, query_embeddings, n_results=10, include=("documents", "metadatas", "distances")):
+        """Cosine top-k for each query; returns Chroma's list-of-lists result shape."""
+        result = {"ids": []}
+        for key in include:
+            result[key] = []
+        # Snapshot so a concurrent upsert or reload can't change the matrix mid-query
+        with self._lock:
+            matrix, scales = self._matrix, self._scales
+            ids, documents, metadatas = self.ids, self.documents, self.metadatas
+        if matrix is None or len(ids) == 0:
+            for _ in query_embeddings:
+                for key in result:
+                    result[key].append([])
+            return result
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        # float16/int8 rows are promoted to float32 inside the product
+        scores = matrix @ queries.T
+        if scales is not None:
+            scores *= scales[:, None]
+
+        k = min(n_results, len(ids))
+        for q in range(len(queries)):
+            column = scores[:, q]
+            top = np.argpartition(-column, k - 1)[:k] if k < len(column) else np.arange(len(column))
+            top = top[np.argsort(-column[top])]
+            result["ids"].append([ids[r] for r in top])
+            if "documents" in include:
+                result["documents"].append([documents[r] for r in top])
+            if "metadatas" in include:
+                result["metadatas"].append([metadatas[r] for r in top])
+            if "distances" in include:
+                result["distances"].append((1.0 - column[top]).tolist())
+            if "embeddings" in include:
+                vectors = np.asarray(matrix[top], dtype=np.float32)
+                if scales is not None:
+                    vectors *= scales[top][:, None]
+                result["embeddings"].append(vectors)
+        return result
+
+
+def open_vector_store(create=False):
+    """Returns the configured store: a Chroma Cloud collection or a LocalVectorStore.
+
+    With create=True (ingestion) the Chroma collection is created if missing.
+    """
+    if VECTOR_STORE == "local":
+        return LocalVectorStore()
+    if VECTOR_STORE != "chroma":
+        raise ValueError(f"Unknown VECTOR_STORE: {VECTOR_STORE}")
+
+    import chromadb
+    client = chromadb.CloudClient(
+        api_key=os.getenv("CHROMADB_API_KEY"),
+        tenant=os.getenv("CHROMADB_TENANT"),
+        database=os.getenv("CHROMADB_DATABASE")
+    )
+    if create:
+        return client.get_or_create_collection(name=COLLECTION_NAME)
+    return client.get_collection(name=COLLECTION_NAME)